@@ -3,34 +3,212 @@
 Task 0: Logging database queries using a decorator
 """
 
-import sqlite3
+import atexit
+import bisect
 import functools
-from datetime import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+SLOW_QUERY_MS = float(os.environ.get("QUERY_LOG_SLOW_MS", 100))
+SAMPLE_RATE = float(os.environ.get("QUERY_LOG_SAMPLE", 0.01))
+
+logger = logging.getLogger("query_log")
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(query):
+    """
+    Normalize a query into its shape: comments dropped, literals
+    replaced by ?, IN lists collapsed and whitespace squeezed.
+    """
+    query = _COMMENTS.sub(" ", query)
+    query = _STRINGS.sub("?", query)
+    query = _NUMBERS.sub("?", query)
+    query = _LISTS.sub("(?+)", query)
+    return _SPACES.sub(" ", query).strip().lower()
+
+
+class QueryStats:
+    """
+    Counters for one query fingerprint.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms, rows, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows or 0
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS,
+                                          elapsed_ms)] += 1
+
+    def percentile(self, q):
+        """
+        Upper bound of the histogram bucket holding the q quantile.
+        """
+        target = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max_ms
 
 
-def log_queries(func):
+class QueryProfiler:
     """
-    Decorator that logs SQL queries before executing the function.
+    Aggregates timings and row counts per query fingerprint.
     """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # Extract the SQL query from function args/kwargs
-        query = None
 
-        # If the function receives query as positional or keyword arg
-        if args:
-            query = args[0]
-        elif "query" in kwargs:
-            query = kwargs["query"]
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
 
-        # Log the query with timestamp
-        if query:
-            print(f"[{datetime.now()}] Executing SQL query: {query}")
+    def record(self, query, elapsed_ms, rows=None, failed=False):
+        key = fingerprint(query)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats()
+            stats.add(elapsed_ms, rows, failed)
+        return key
+
+    def top(self, n=10, by="total_ms"):
+        """
+        Return the n most expensive fingerprints as dicts,
+        ordered by total_ms, max_ms, calls or rows.
+        """
+        with self._lock:
+            items = [(key, stats) for key, stats in self._stats.items()]
+            rows = [{"fingerprint": key, "calls": stats.calls,
+                     "errors": stats.errors, "total_ms": stats.total_ms,
+                     "mean_ms": stats.total_ms / stats.calls,
+                     "p50_ms": stats.percentile(0.5),
+                     "p95_ms": stats.percentile(0.95),
+                     "max_ms": stats.max_ms, "rows": stats.rows,
+                     "histogram": list(stats.histogram)}
+                    for key, stats in items]
+        rows.sort(key=lambda row: row[by], reverse=True)
+        return rows[:n]
+
+    def report(self, n=10, by="total_ms"):
+        """
+        Format top() as a text table.
+        """
+        lines = [f"{'total ms':>10} {'calls':>7} {'mean ms':>8} "
+                 f"{'p95 ms':>7} {'rows':>8}  query"]
+        for row in self.top(n, by):
+            lines.append(f"{row['total_ms']:10.1f} {row['calls']:7d} "
+                         f"{row['mean_ms']:8.2f} {row['p95_ms']:7g} "
+                         f"{row['rows']:8d}  {row['fingerprint']}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# Global profiler used by @log_queries
+profiler = QueryProfiler()
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    """
+    Route query_log records through a queue so that logging never
+    blocks the caller; a background listener writes them to stderr.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        records = queue.SimpleQueue()
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(
+            "[%(asctime)s] %(levelname)s %(message)s"))
+        logger.addHandler(logging.handlers.QueueHandler(records))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+        atexit.register(_listener.stop)  # flush pending records on exit
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return None
+
+
+def log_queries(func=None, *, slow_ms=None, sample_rate=None,
+                query_profiler=None):
+    """
+    Decorator that profiles the SQL query passed as the first
+    argument (or query=): every call is timed and aggregated
+    per fingerprint, and calls slower than slow_ms, plus a
+    random sample_rate share of the rest, are logged.
+    Use as @log_queries or @log_queries(slow_ms=..., ...).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Extract the SQL query from function args/kwargs
+            query = kwargs.get("query", args[0] if args else None)
+            if not query:
+                return func(*args, **kwargs)
+            params = kwargs.get("params", args[1] if len(args) > 1 else None)
 
-        # Call the actual function
-        return func(*args, **kwargs)
+            failed = True
+            rows = None
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                rows = _row_count(result)
+                return result
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                stats = query_profiler or profiler
+                shape = stats.record(query, elapsed_ms, rows, failed)
+                threshold = SLOW_QUERY_MS if slow_ms is None else slow_ms
+                rate = SAMPLE_RATE if sample_rate is None else sample_rate
+                if elapsed_ms >= threshold or failed \
+                        or random.random() < rate:
+                    _start_listener()
+                    level = logging.WARNING if elapsed_ms >= threshold \
+                        or failed else logging.INFO
+                    logger.log(level, "%.2f ms, %s rows%s: %s params=%r",
+                               elapsed_ms, "?" if rows is None else rows,
+                               " (failed)" if failed else "", shape, params)
+        return wrapper
 
-    return wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
 
 
 @log_queries
@@ -50,3 +228,4 @@ if __name__ == "__main__":
     # Example usage
     users = fetch_all_users(query="SELECT * FROM users")
     print(users)
+    print(profiler.report())
@@ -3,26 +3,7 @@
 Task 1: Handle Database Connections with a Decorator
 """
 
-import sqlite3
-import functools
-
-
-def with_db_connection(func):
-    """
-    Decorator that automatically opens and closes
-    a SQLite database connection.
-    The connection is passed as the first argument to the function.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")  # open connection
-        try:
-            # Inject connection as the first argument
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()  # always close connection
-        return result
-    return wrapper
+from db_connection import with_db_connection
 
 
 @with_db_connection
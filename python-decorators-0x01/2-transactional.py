@@ -3,25 +3,15 @@
 Task 2: Transaction Management Decorator
 """
 
-import sqlite3
 import functools
 
+import query_events
+from db_connection import with_db_connection
 
-def with_db_connection(func):
-    """
-    Decorator that automatically opens and closes
-    a SQLite database connection.
-    The connection is passed as the first argument to the function.
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")  # open connection
-        try:
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()  # always close connection
-        return result
-    return wrapper
+
+# SQL recorded per connection; nested calls on one pooled connection
+# share the outermost call's list
+_statements = {}
 
 
 def transactional(func):
@@ -29,17 +19,31 @@ def transactional(func):
     Decorator to manage database transactions.
     Commits if the function succeeds,
     rolls back if an exception occurs.
+    After every commit, the tables written are published through
+    query_events so caches can drop results that read them.
     """
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        outermost = conn not in _statements
+        if outermost:
+            _statements[conn] = []
+            conn.set_trace_callback(_statements[conn].append)
+        statements = _statements[conn]
         try:
             result = func(conn, *args, **kwargs)
             conn.commit()   # commit if successful
-            return result
         except Exception as e:
             conn.rollback()  # rollback on error
             print(f"Transaction rolled back due to error: {e}")
             raise
+        finally:
+            if outermost:
+                conn.set_trace_callback(None)
+                del _statements[conn]
+        written = query_events.tables_written(statements)
+        statements.clear()
+        query_events.publish(written)
+        return result
     return wrapper
 
 
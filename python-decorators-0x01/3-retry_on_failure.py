@@ -3,49 +3,135 @@
 Task 3: Retry Database Queries with a Decorator
 """
 
-import time
-import sqlite3
+import asyncio
 import functools
+import inspect
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from db_connection import with_db_connection
+
+logger = logging.getLogger("retry")
 
 
-def with_db_connection(func):
+def is_transient(error):
     """
-    Decorator that automatically opens and closes
-    a SQLite database connection.
+    Default retry predicate: only SQLite lock/busy errors,
+    which usually clear once the other writer finishes.
     """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")  # open connection
-        try:
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()  # always close
-        return result
-    return wrapper
-
-
-def retry_on_failure(retries=3, delay=2):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message)
+
+
+class RetryBudget:
+    """
+    Process-wide cap on retries, so failures don't multiply load.
+    Every first attempt deposits `ratio` tokens and every retry
+    spends one; `min_per_second` tokens trickle in regardless so
+    rarely called functions can still retry. Tokens are capped
+    at max_tokens.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_tokens=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self._tokens = min(self.max_tokens, self._tokens + amount)
+
+    def record_call(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_spend(self):
+        """
+        Take one retry token; False if the budget is exhausted.
+        """
+        with self._lock:
+            self._refill(0)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+# Global budget shared by every @retry_on_failure
+retry_budget = RetryBudget()
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, retry_if=is_transient,
+                     budget=None):
     """
     Decorator factory to retry a function if it fails.
-    :param retries: number of retry attempts
-    :param delay: delay (in seconds) between retries
+    Works on plain functions and on coroutine functions
+    (which sleep with asyncio.sleep instead of blocking).
+    :param retries: total number of attempts
+    :param delay: base delay (in seconds); attempt n waits a random
+        time between 0 and min(max_delay, delay * 2 ** (n - 1))
+    :param max_delay: cap on the backoff (in seconds)
+    :param retry_if: predicate deciding if an exception is retryable
+    :param budget: RetryBudget to draw from (default retry_budget)
     """
+    if retries < 1:
+        raise ValueError("retries must be at least 1")
+
+    def next_delay(func, attempt, error):
+        """
+        Return the backoff before the next attempt, or None to give up.
+        """
+        name = func.__qualname__
+        if not retry_if(error):
+            return None
+        if attempt >= retries:
+            logger.error("%s failed after %d attempts: %s",
+                         name, attempt, error)
+            return None
+        if not (budget or retry_budget).try_spend():
+            logger.error("%s failed, retry budget exhausted: %s",
+                         name, error)
+            return None
+        wait = random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+        logger.warning("%s attempt %d failed: %s; retrying in %.2fs",
+                       name, attempt, error, wait)
+        return wait
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                (budget or retry_budget).record_call()
+                for attempt in range(1, retries + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        wait = next_delay(func, attempt, e)
+                        if wait is None:
+                            raise
+                    await asyncio.sleep(wait)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
+            (budget or retry_budget).record_call()
             for attempt in range(1, retries + 1):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    print(f"Attempt {attempt} failed: {e}")
-                    if attempt < retries:
-                        print(f"Retrying in {delay} seconds...")
-                        time.sleep(delay)
-            # After all retries fail
-            print("All retry attempts failed.")
-            raise last_exception
+                    wait = next_delay(func, attempt, e)
+                    if wait is None:
+                        raise
+                time.sleep(wait)
         return wrapper
     return decorator
 
@@ -62,6 +148,7 @@ def fetch_users_with_retry(conn):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     try:
         users = fetch_users_with_retry()
         print(users)
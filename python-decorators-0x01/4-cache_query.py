@@ -3,49 +3,352 @@
 Task 4: Cache Database Queries with a Decorator
 """
 
-import sqlite3
 import functools
+import hashlib
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 
-# Global dictionary to store cached results
-query_cache = {}
+import query_events
+from db_connection import with_db_connection
 
 
-def with_db_connection(func):
+def _freeze(value):
     """
-    Decorator that automatically opens and closes
-    a SQLite database connection.
+    Turn call arguments into a hashable key part.
     """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")  # open connection
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+class QueryCache:
+    """
+    Bounded in-process query result cache with LRU and TTL eviction.
+    Each entry is tagged with the tables its query reads;
+    writes published through query_events drop the entries
+    tagged with the written tables.
+
+    Cache backends for cache_query provide get(key), stamp(tables),
+    set(key, value, tables, stamp), invalidate(tables), clear()
+    and stats(). stamp() is taken before the query runs, so set()
+    can refuse a result that a concurrent write made stale.
+    """
+
+    def __init__(self, maxsize=256, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, tables, value)
+        self._by_table = {}            # table -> set of keys
+        self._generations = {}         # table -> write count
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        query_events.subscribe(self.invalidate)
+
+    def _drop(self, key):
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def get(self, key):
+        """
+        Return (True, value) for a live entry, else (False, None).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def stamp(self, tables):
+        """
+        Return the current write generation of the given tables.
+        """
+        with self._lock:
+            return {table: self._generations.get(table, 0)
+                    for table in tables}
+
+    def set(self, key, value, tables, stamp=None):
+        """
+        Store value under key, tagged with the tables it reads,
+        unless those tables were written since stamp was taken.
+        """
+        with self._lock:
+            if stamp is not None and any(
+                    self._generations.get(table, 0) != generation
+                    for table, generation in stamp.items()):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl,
+                                  frozenset(tables), value)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tables):
+        """
+        Drop entries that read any of the given tables.
+        """
+        tables = {table.lower() for table in tables}
+        tables.add(query_events.ANY_TABLE)
+        with self._lock:
+            keys = set()
+            for table in tables:
+                self._generations[table] = \
+                    self._generations.get(table, 0) + 1
+                keys.update(self._by_table.get(table, ()))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Return the cache counters as a dict.
+        """
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations,
+                    "invalidations": self.invalidations}
+
+
+class DiskCache:
+    """
+    Query result cache in a directory shared by local worker
+    processes (put it on tmpfs, e.g. /dev/shm, for a shared-memory
+    store). Entries are pickled to one file each and written
+    atomically (temp file + os.replace), so readers never see a
+    partial entry. Every table has a generation file that writes
+    append one byte to; an entry records the generations it was
+    computed under and is stale once any of them grew, so a
+    write in any process invalidates the entry for all of them.
+    Counters in stats() are per process. The directory is
+    created private to the user, since entries are unpickled.
+    """
+
+    def __init__(self, directory, maxsize=10000, ttl=300.0):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._tables = os.path.join(directory, "_tables")
+        os.makedirs(self._tables, mode=0o700, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        query_events.subscribe(self.invalidate)
+
+    def _path(self, key):
+        digest = hashlib.sha256(
+            pickle.dumps(key, pickle.HIGHEST_PROTOCOL)).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def _generation(self, table):
+        name = "_any" if table == query_events.ANY_TABLE else table
         try:
-            result = func(conn, *args, **kwargs)
-        finally:
-            conn.close()  # always close connection
-        return result
-    return wrapper
+            return os.stat(os.path.join(self._tables, name)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def stamp(self, tables):
+        """
+        Return the current write generation of the given tables.
+        """
+        return {table: self._generation(table) for table in tables}
+
+    def get(self, key):
+        """
+        Return (True, value) for a live entry, else (False, None).
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires, stamp, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+        if expires < time.time() or self.stamp(stamp) != stamp:
+            self.expirations += 1
+            self.misses += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return False, None
+        try:
+            os.utime(path)  # mtime marks recent use for LRU pruning
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return True, value
+
+    def set(self, key, value, tables, stamp=None):
+        """
+        Store value under key, tagged with the tables it reads,
+        unless those tables were written since stamp was taken.
+        """
+        current = self.stamp(tables)
+        if stamp is not None and any(current[table] != generation
+                                     for table, generation in stamp.items()):
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((time.time() + self.ttl, current, value), f,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        if random.random() < 1 / 64:
+            self.prune()
+
+    def invalidate(self, tables):
+        """
+        Mark the given tables (and untagged queries) as written.
+        """
+        names = {table.lower() for table in tables} | {"_any"}
+        for name in names:
+            fd = os.open(os.path.join(self._tables, name),
+                         os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            try:
+                os.write(fd, b"\0")
+            finally:
+                os.close(fd)
+        self.invalidations += 1
+
+    def _entry_files(self):
+        for shard in os.listdir(self.directory):
+            if shard.startswith("_"):
+                continue
+            shard = os.path.join(self.directory, shard)
+            for name in os.listdir(shard):
+                if not name.startswith("tmp"):
+                    yield os.path.join(shard, name)
 
+    def prune(self):
+        """
+        Delete the least recently used entries beyond maxsize.
+        """
+        files = []
+        for path in self._entry_files():
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                pass
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.maxsize)]:
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
 
-def cache_query(func):
+    def clear(self):
+        for path in self._entry_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return sum(1 for _ in self._entry_files())
+
+    def stats(self):
+        """
+        Return this process's cache counters as a dict.
+        """
+        return {"size": len(self), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations}
+
+
+# Global cache used by @cache_query; set QUERY_CACHE_DIR to share
+# it between worker processes
+if os.environ.get("QUERY_CACHE_DIR"):
+    query_cache = DiskCache(os.environ["QUERY_CACHE_DIR"])
+else:
+    query_cache = QueryCache()
+
+
+def cache_query(func=None, *, cache=None):
     """
-    Decorator that caches query results based on the SQL query string.
+    Decorator that caches query results based on the SQL query string
+    and the other call arguments (e.g. bound parameters).
     If the query has been executed before, return the cached result.
+    Use as @cache_query, or @cache_query(cache=...) with a
+    QueryCache, a DiskCache or any object with the same methods
+    to use a cache other than the global query_cache.
     """
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        # Extract the query string from either args or kwargs
-        query = kwargs.get("query") if "query" in kwargs else args[0]
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            store = cache if cache is not None else query_cache
+            # Extract the query string from either args or kwargs
+            if "query" in kwargs:
+                query = kwargs["query"]
+                rest = args
+            else:
+                query, rest = args[0], args[1:]
+            extra = {k: v for k, v in kwargs.items() if k != "query"}
+            key = (query, _freeze(rest), _freeze(extra))
+
+            hit, result = store.get(key)
+            if hit:
+                print(f"[CACHE HIT] Returning cached result for query: "
+                      f"{query}")
+                return result
 
-        if query in query_cache:
-            print(f"[CACHE HIT] Returning cached result for query: {query}")
-            return query_cache[query]
+            # Execute the actual function and cache its result
+            tables = query_events.tables_read(query)
+            stamp = store.stamp(tables)
+            result = func(conn, *args, **kwargs)
+            store.set(key, result, tables, stamp)
+            print(f"[CACHE MISS] Caching result for query: {query}")
+            return result
+        return wrapper
 
-        # Execute the actual function and cache its result
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result
-        print(f"[CACHE MISS] Caching result for query: {query}")
-        return result
-    return wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
 
 
 @with_db_connection
@@ -68,3 +371,5 @@ if __name__ == "__main__":
     # Second call: returns cached result
     users_again = fetch_users_with_cache(query="SELECT * FROM users")
     print(users_again)
+
+    print(query_cache.stats())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-call overhead of opening a connection per call
+versus the shared pool in db_connection
+"""
+
+import argparse
+import functools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import db_connection
+
+
+def open_close_connection(path):
+    """
+    The old with_db_connection: connect and close on every call.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            conn = sqlite3.connect(path)
+            try:
+                return func(conn, *args, **kwargs)
+            finally:
+                conn.close()
+        return wrapper
+    return decorator
+
+
+def get_user(conn, user_id):
+    return conn.execute("SELECT * FROM users WHERE id = ?",
+                        (user_id,)).fetchone()
+
+
+def timed(func, calls, threads):
+    """
+    Run func(i) calls times split over threads; return seconds.
+    """
+    per_thread = calls // threads
+
+    def run():
+        for i in range(per_thread):
+            func(i % 100 + 1)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--pool-size", type=int,
+                        default=db_connection.MAX_POOL_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE users "
+                     "(id INTEGER PRIMARY KEY, name TEXT, email TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                         [(i, f"user{i}", f"user{i}@example.com")
+                          for i in range(1, 101)])
+        conn.commit()
+        conn.close()
+
+        db_connection.configure(path, args.pool_size)
+        variants = {
+            "open/close": open_close_connection(path)(get_user),
+            "pooled": db_connection.with_db_connection(get_user),
+        }
+        for threads in args.threads:
+            for name, func in variants.items():
+                seconds = timed(func, args.calls, threads)
+                print(f"{name:>10} threads={threads}: "
+                      f"{seconds / args.calls * 1e6:7.1f} us/call")
+        db_connection.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
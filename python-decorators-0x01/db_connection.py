@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Shared pooled SQLite connections for the decorator tasks
+"""
+
+import functools
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Database file, overridable with USERS_DB or configure()
+DB_PATH = os.environ.get("USERS_DB", "users.db")
+MAX_POOL_SIZE = 8
+POOL_TIMEOUT = 30.0
+
+
+class ConnectionPool:
+    """
+    Pool of at most max_size SQLite connections.
+    Idle connections are reused most-recently-released first,
+    and nested acquires on one thread share that thread's
+    connection, so stacked decorators use a single connection.
+    A connection is rolled back before going back to the pool,
+    which drops any uncommitted work like closing it used to.
+    """
+
+    def __init__(self, path=DB_PATH, max_size=MAX_POOL_SIZE,
+                 timeout=POOL_TIMEOUT):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+
+    def acquire(self):
+        """
+        Return a connection for the calling thread.
+        Blocks up to timeout seconds when all are in use.
+        """
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(
+                f"No free connection to {self.path} after "
+                f"{self.timeout}s (max_size={self.max_size})")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+            except Exception:
+                self._slots.release()
+                raise
+        self._local.held = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """
+        Give back a connection returned by acquire().
+        """
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+        self._local.held = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()  # broken: the next acquire opens a new one
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager around acquire() and release().
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(path=None, max_size=None, timeout=None):
+    """
+    Replace the shared pool, e.g. to point it at another database.
+    """
+    global _pool
+    with _pool_lock:
+        old = _pool
+        _pool = ConnectionPool(
+            path or (old.path if old else DB_PATH),
+            max_size or (old.max_size if old else MAX_POOL_SIZE),
+            timeout or (old.timeout if old else POOL_TIMEOUT))
+    if old is not None and old.pid == os.getpid():
+        old.close()
+    return _pool
+
+
+def get_pool():
+    """
+    Return the shared pool, creating a fresh one in a forked child.
+    """
+    global _pool
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+            elif _pool.pid != os.getpid():
+                _pool = ConnectionPool(_pool.path, _pool.max_size,
+                                       _pool.timeout)
+            pool = _pool
+    return pool
+
+
+def with_db_connection(func):
+    """
+    Decorator that passes a pooled SQLite connection
+    as the first argument to the function.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            pool.release(conn)
+    return wrapper
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Shared helpers: which tables a query touches, and notifications
+when tables are written (used to invalidate query caches)
+"""
+
+import re
+import threading
+import weakref
+
+# Tag for queries whose tables could not be worked out
+ANY_TABLE = "*"
+
+_FROM = re.compile(r"\bFROM\b", re.IGNORECASE)
+_FROM_END = re.compile(
+    r"\b(?:WHERE|GROUP|ORDER|LIMIT|HAVING|UNION|EXCEPT|INTERSECT"
+    r"|WINDOW|RETURNING)\b|;",
+    re.IGNORECASE)
+_FROM_ITEM = re.compile(r",|\bJOIN\b", re.IGNORECASE)
+_INNERMOST_GROUP = re.compile(r"\([^()]*\)")
+_TABLE_NAME = re.compile(r"\s*[\"`\[]?(\w+)")
+_WRITE_TABLES = re.compile(
+    r"^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE"
+    r"(?:\s+OR\s+\w+)?|DELETE\s+FROM|DROP\s+TABLE(?:\s+IF\s+EXISTS)?"
+    r"|ALTER\s+TABLE)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE)
+
+_subscribers = []
+_lock = threading.Lock()
+
+
+def _flat_tables_read(query):
+    """
+    Tables in the FROM clauses of a query without parentheses.
+    """
+    tables = set()
+    for match in _FROM.finditer(query):
+        rest = query[match.end():]
+        end = _FROM_END.search(rest)
+        # FROM a x, b JOIN c ON ...: each item after a comma or
+        # JOIN starts with a table name
+        for item in _FROM_ITEM.split(rest[:end.start()] if end else rest):
+            name = _TABLE_NAME.match(item)
+            if name:
+                tables.add(name.group(1).lower())
+    return tables
+
+
+def tables_read(query):
+    """
+    Return the set of lower-cased table names a SELECT reads,
+    or {ANY_TABLE} if none can be found.
+    """
+    tables = set()
+    # Read subqueries innermost first, leaving "?" in their place
+    while True:
+        group = _INNERMOST_GROUP.search(query)
+        if group is None:
+            break
+        tables |= _flat_tables_read(group.group()[1:-1])
+        query = f"{query[:group.start()]} ? {query[group.end():]}"
+    tables |= _flat_tables_read(query)
+    return tables or {ANY_TABLE}
+
+
+def tables_written(statements):
+    """
+    Return the set of lower-cased table names written by
+    the given SQL statements.
+    """
+    tables = set()
+    for statement in statements:
+        match = _WRITE_TABLES.match(statement)
+        if match:
+            tables.add(match.group(1).lower())
+    return tables
+
+
+def subscribe(callback):
+    """
+    Call callback(tables) after every publish().
+    Bound methods are held weakly, so subscribing a cache
+    does not keep it alive.
+    """
+    if hasattr(callback, "__self__"):
+        ref = weakref.WeakMethod(callback)
+    else:
+        def ref():
+            return callback
+    with _lock:
+        _subscribers.append(ref)
+
+
+def publish(tables):
+    """
+    Tell subscribers that the given tables were written.
+    """
+    if not tables:
+        return
+    with _lock:
+        _subscribers[:] = [ref for ref in _subscribers if ref() is not None]
+        callbacks = [ref() for ref in _subscribers]
+    for callback in callbacks:
+        if callback is not None:
+            callback(set(tables))
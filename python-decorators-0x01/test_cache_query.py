@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the query cache in 4-cache_query and query_events
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db_connection
+import query_events
+
+cache_module = __import__("4-cache_query")
+transactional_module = __import__("2-transactional")
+DiskCache = cache_module.DiskCache
+QueryCache = cache_module.QueryCache
+
+
+def invalidate_in_child(directory, tables):
+    """Write tables through a DiskCache opened in another process"""
+    DiskCache(directory).invalidate(tables)
+
+
+class TestTablesRead(unittest.TestCase):
+    """Test class for query_events.tables_read"""
+
+    def test_tables_read(self):
+        """Every table in FROM lists, joins and subqueries is found"""
+        cases = [
+            ("SELECT * FROM users", {"users"}),
+            ("SELECT * FROM users u, orders o WHERE u.id = o.user_id",
+             {"users", "orders"}),
+            ("SELECT * FROM users JOIN orders ON users.id = orders.uid",
+             {"users", "orders"}),
+            ("SELECT * FROM users LEFT JOIN orders USING (id), items",
+             {"users", "orders", "items"}),
+            ("SELECT * FROM (SELECT * FROM a) x, b", {"a", "b"}),
+            ("SELECT * FROM a WHERE id IN (SELECT uid FROM c, d)",
+             {"a", "c", "d"}),
+            ('SELECT * FROM "Users"', {"users"}),
+            ("SELECT 1", {query_events.ANY_TABLE}),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(query_events.tables_read(query), expected)
+
+    def test_tables_written(self):
+        """Write statements report the table they change"""
+        self.assertEqual(query_events.tables_written([
+            "BEGIN ",
+            "UPDATE users SET email = 'a' WHERE id = 1",
+            "INSERT OR REPLACE INTO Orders VALUES (1)",
+            "DELETE FROM items",
+            "SELECT * FROM logs",
+            "COMMIT",
+        ]), {"users", "orders", "items"})
+
+
+class TestQueryCache(unittest.TestCase):
+    """Test class for QueryCache eviction and invalidation"""
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted past maxsize"""
+        cache = QueryCache(maxsize=2)
+        cache.set("a", 1, {"users"})
+        cache.set("b", 2, {"users"})
+        self.assertEqual(cache.get("a"), (True, 1))  # a is now newest
+        cache.set("c", 3, {"users"})
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("c"), (True, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        """Entries older than ttl are misses"""
+        cache = QueryCache(ttl=10)
+        with patch.object(cache_module.time, "monotonic", return_value=100):
+            cache.set("a", 1, {"users"})
+        with patch.object(cache_module.time, "monotonic", return_value=109):
+            self.assertEqual(cache.get("a"), (True, 1))
+        with patch.object(cache_module.time, "monotonic", return_value=111):
+            self.assertEqual(cache.get("a"), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"],
+                          stats["expirations"]), (1, 1, 1))
+
+    def test_invalidate_by_table(self):
+        """Only entries reading a written table are dropped"""
+        cache = QueryCache()
+        cache.set("users", 1, {"users"})
+        cache.set("joined", 2, {"users", "orders"})
+        cache.set("items", 3, {"items"})
+        cache.set("unknown", 4, {query_events.ANY_TABLE})
+        query_events.publish({"orders"})
+        self.assertEqual(cache.get("users"), (True, 1))
+        self.assertEqual(cache.get("joined"), (False, None))
+        self.assertEqual(cache.get("items"), (True, 3))
+        self.assertEqual(cache.get("unknown"), (False, None))
+
+    def test_stale_stamp_is_not_stored(self):
+        """A result computed across a write to its table is dropped"""
+        cache = QueryCache()
+        stamp = cache.stamp({"users"})
+        cache.invalidate({"users"})
+        cache.set("a", 1, {"users"}, stamp)
+        self.assertEqual(cache.get("a"), (False, None))
+
+
+class TestDiskCache(unittest.TestCase):
+    """Test class for DiskCache shared between processes"""
+
+    def setUp(self):
+        """Create a cache in a temporary directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.cache = DiskCache(self.directory)
+
+    def invalidate_elsewhere(self, tables):
+        """Invalidate tables from a separate process"""
+        process = multiprocessing.Process(
+            target=invalidate_in_child, args=(self.directory, tables))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+
+    def test_entries_are_shared(self):
+        """An entry set by one instance is read by another"""
+        self.cache.set("a", [(1,)], {"users"})
+        self.assertEqual(DiskCache(self.directory).get("a"), (True, [(1,)]))
+
+    def test_write_in_other_process_invalidates(self):
+        """A write in another process invalidates only its tables"""
+        self.cache.set("users", 1, {"users"})
+        self.cache.set("orders", 2, {"orders"})
+        self.invalidate_elsewhere({"Users"})
+        self.assertEqual(self.cache.get("users"), (False, None))
+        self.assertEqual(self.cache.get("orders"), (True, 2))
+
+    def test_stale_stamp_from_other_process(self):
+        """A result computed across another process's write is dropped"""
+        stamp = self.cache.stamp({"users"})
+        self.invalidate_elsewhere({"users"})
+        self.cache.set("a", 1, {"users"}, stamp)
+        self.assertEqual(self.cache.get("a"), (False, None))
+
+    def test_ttl_expiry(self):
+        """Entries older than ttl are misses and removed"""
+        cache = DiskCache(self.directory, ttl=10)
+        with patch.object(cache_module.time, "time", return_value=100):
+            cache.set("a", 1, {"users"})
+        with patch.object(cache_module.time, "time", return_value=111):
+            self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(list(cache._entry_files()), [])
+
+    def test_prune_keeps_recent_entries(self):
+        """prune() deletes the least recently used entries"""
+        cache = DiskCache(self.directory, maxsize=2)
+        for i, key in enumerate("abc"):
+            cache.set(key, i, {"users"})
+            os.utime(cache._path(key), (i, i))
+        cache.prune()
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(cache.get("b"), (True, 1))
+        self.assertEqual(cache.get("c"), (True, 2))
+
+
+class TestTransactionalInvalidation(unittest.TestCase):
+    """cache_query results are invalidated by transactional writes"""
+
+    def setUp(self):
+        """Point the shared pool at a temporary users table"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "users.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                     "name TEXT, email TEXT)")
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, "
+                     "user_id INTEGER)")
+        conn.execute("INSERT INTO users VALUES (1, 'a', 'a@example.com')")
+        conn.execute("INSERT INTO orders VALUES (1, 1)")
+        conn.commit()
+        conn.close()
+        old_path = db_connection.get_pool().path
+        db_connection.configure(path)
+        self.addCleanup(db_connection.configure, old_path)
+
+    def test_write_to_joined_table_invalidates(self):
+        """Writing either table of a comma join refreshes the result"""
+        cache = QueryCache()
+
+        @db_connection.with_db_connection
+        @cache_module.cache_query(cache=cache)
+        def fetch(conn, query):
+            return conn.execute(query).fetchall()
+
+        @db_connection.with_db_connection
+        @transactional_module.transactional
+        def add_order(conn):
+            conn.execute("INSERT INTO orders VALUES (2, 1)")
+
+        query = ("SELECT COUNT(*) FROM users u, orders o "
+                 "WHERE u.id = o.user_id")
+        with patch("builtins.print"):
+            self.assertEqual(fetch(query=query), [(1,)])
+            add_order()
+            self.assertEqual(fetch(query=query), [(2,)])
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+
+    def test_nested_transactions_publish_outer_writes(self):
+        """A nested transactional call does not drop the outer's writes"""
+        cache = QueryCache()
+
+        @db_connection.with_db_connection
+        @cache_module.cache_query(cache=cache)
+        def fetch(conn, query):
+            return conn.execute(query).fetchall()
+
+        @db_connection.with_db_connection
+        @transactional_module.transactional
+        def add_order(conn):
+            conn.execute("INSERT INTO orders VALUES (2, 1)")
+
+        @db_connection.with_db_connection
+        @transactional_module.transactional
+        def add_user(conn):
+            add_order()
+            conn.execute("INSERT INTO users VALUES (2, 'b', 'b@example.com')")
+
+        published = []
+        query_events.subscribe(lambda tables: published.append(tables))
+        self.addCleanup(query_events._subscribers.pop)
+        query = "SELECT COUNT(*) FROM users"
+        with patch("builtins.print"):
+            self.assertEqual(fetch(query=query), [(1,)])
+            add_user()
+            self.assertEqual(fetch(query=query), [(2,)])
+        self.assertEqual(published, [{"orders"}, {"users"}])
+
+if __name__ == "__main__":
+    unittest.main()
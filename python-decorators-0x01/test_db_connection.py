@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pooled connections in db_connection
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import db_connection
+from db_connection import ConnectionPool
+
+
+def check_pool_in_child(parent_pool_id, path):
+    """Exit 0 if a forked child gets its own pool on the same database"""
+    pool = db_connection.get_pool()
+    fresh = id(pool) != parent_pool_id and pool.pid == os.getpid()
+    with pool.connection() as conn:
+        conn.execute("SELECT COUNT(*) FROM users").fetchone()
+    os._exit(0 if fresh and pool.path == path else 1)
+
+
+class PoolTestCase(unittest.TestCase):
+    """Pools over a temporary users database"""
+
+    def setUp(self):
+        """Create a users table in a temporary directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "users.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                     "name TEXT)")
+        conn.commit()
+        conn.close()
+
+    def make_pool(self, **kwargs):
+        """A pool on the temporary database, closed after the test"""
+        pool = ConnectionPool(self.path, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def count_users(self):
+        """Rows in users, read on a separate connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        finally:
+            conn.close()
+
+
+class TestConnectionPool(PoolTestCase):
+    """Test class for ConnectionPool"""
+
+    def test_nested_acquires_share_a_connection(self):
+        """Nested acquires on one thread get the same connection"""
+        pool = self.make_pool(max_size=1, timeout=0.1)
+        with pool.connection() as outer:
+            with pool.connection() as inner:
+                self.assertIs(inner, outer)
+                self.assertEqual(pool._local.depth, 2)
+            self.assertEqual(pool._local.depth, 1)
+        self.assertIsNone(pool._local.held)
+        with pool.connection() as again:
+            self.assertIs(again, outer)  # reused from the idle queue
+
+    def test_uncommitted_work_is_rolled_back(self):
+        """Releasing a connection drops its open transaction"""
+        pool = self.make_pool()
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO users VALUES (1, 'a')")
+            self.assertTrue(conn.in_transaction)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.count_users(), 0)
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO users VALUES (1, 'a')")
+            conn.commit()
+        self.assertEqual(self.count_users(), 1)
+
+    def test_exhausted_pool_times_out(self):
+        """acquire() raises TimeoutError once max_size are in use"""
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        held = pool.acquire()
+        errors = []
+
+        def acquire_elsewhere():
+            try:
+                pool.acquire()
+            except TimeoutError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=acquire_elsewhere)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        pool.release(held)
+        thread = threading.Thread(target=acquire_elsewhere)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+
+    def test_failed_connect_frees_slot(self):
+        """A connection that cannot be opened does not use up a slot"""
+        pool = ConnectionPool(os.path.join(self.path, "missing", "db"),
+                              max_size=1, timeout=0.05)
+        for _ in range(2):
+            with self.assertRaises(sqlite3.OperationalError):
+                pool.acquire()
+
+
+class TestSharedPool(PoolTestCase):
+    """Test class for configure(), get_pool() and with_db_connection"""
+
+    def setUp(self):
+        """Point the shared pool at the temporary database"""
+        super().setUp()
+        old_path = db_connection.get_pool().path
+        db_connection.configure(self.path)
+        self.addCleanup(db_connection.configure, old_path)
+
+    def test_stacked_decorators_share_a_connection(self):
+        """with_db_connection inside with_db_connection reuses the conn"""
+        seen = []
+
+        @db_connection.with_db_connection
+        def inner(conn):
+            seen.append(conn)
+
+        @db_connection.with_db_connection
+        def outer(conn):
+            seen.append(conn)
+            inner()
+
+        outer()
+        self.assertIs(seen[0], seen[1])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_fresh_pool_after_fork(self):
+        """A forked child opens its own pool instead of the parent's"""
+        pool = db_connection.get_pool()
+        with pool.connection():
+            pass
+        process = multiprocessing.get_context("fork").Process(
+            target=check_pool_in_child, args=(id(pool), self.path))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertIs(db_connection.get_pool(), pool)
+
+
+if __name__ == "__main__":
+    unittest.main()
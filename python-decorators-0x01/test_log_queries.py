@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the query profiler in 0-log_queries
+"""
+
+import logging
+import unittest
+from unittest.mock import patch
+
+log_module = __import__("0-log_queries")
+QueryProfiler = log_module.QueryProfiler
+QueryStats = log_module.QueryStats
+fingerprint = log_module.fingerprint
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test class for fingerprint"""
+
+    def test_fingerprint(self):
+        """Queries differing only in literals share a fingerprint"""
+        cases = [
+            ("SELECT * FROM users WHERE id = 42",
+             "select * from users where id = ?"),
+            ("SELECT * FROM users WHERE name = 'O''Brien' AND age > 2.5",
+             "select * from users where name = ? and age > ?"),
+            ("SELECT *\n  FROM users -- all of them\n /* note */ LIMIT 10",
+             "select * from users limit ?"),
+            ("SELECT * FROM users WHERE id IN (1, 2, 3)",
+             "select * from users where id in (?+)"),
+            ("SELECT * FROM users WHERE id IN (?,?)",
+             "select * from users where id in (?+)"),
+            ("SELECT * FROM table2", "select * from table2"),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(fingerprint(query), expected)
+
+
+class TestQueryStats(unittest.TestCase):
+    """Test class for the latency histogram and percentiles"""
+
+    def test_histogram(self):
+        """Each latency lands in the first bucket bounding it"""
+        stats = QueryStats()
+        for elapsed_ms in (0.5, 1, 1.5, 5000, 6000):
+            stats.add(elapsed_ms, 1, False)
+        self.assertEqual(stats.histogram, [2, 1, 0, 0, 0, 0, 0, 1, 1])
+        self.assertEqual((stats.calls, stats.rows, stats.max_ms),
+                         (5, 5, 6000))
+
+    def test_percentile(self):
+        """percentile() returns the bound of the bucket holding q"""
+        stats = QueryStats()
+        for elapsed_ms in [0.5] * 8 + [20, 2000]:
+            stats.add(elapsed_ms, None, False)
+        self.assertEqual(stats.percentile(0.5), 1)
+        self.assertEqual(stats.percentile(0.9), 50)
+        self.assertEqual(stats.percentile(0.95), 5000)
+        stats.add(9000, None, True)
+        self.assertEqual(stats.percentile(1.0), 9000)
+        self.assertEqual((stats.errors, stats.rows), (1, 0))
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """Test class for QueryProfiler"""
+
+    def setUp(self):
+        """Record three query shapes with different costs"""
+        self.profiler = QueryProfiler()
+        for user_id in range(3):
+            self.profiler.record(
+                f"SELECT * FROM users WHERE id = {user_id}", 1, 1)
+        self.profiler.record("SELECT * FROM orders", 40, 100)
+        self.profiler.record("DELETE FROM logs", 10, failed=True)
+
+    def test_top_by_total_ms(self):
+        """top() orders fingerprints by total time by default"""
+        top = self.profiler.top()
+        self.assertEqual([row["fingerprint"] for row in top],
+                         ["select * from orders", "delete from logs",
+                          "select * from users where id = ?"])
+        users = top[2]
+        self.assertEqual((users["calls"], users["total_ms"],
+                          users["mean_ms"], users["rows"]), (3, 3, 1, 3))
+        self.assertEqual(top[1]["errors"], 1)
+
+    def test_top_by_other_columns(self):
+        """top(n, by) orders by the given column and keeps n rows"""
+        self.assertEqual(
+            [row["fingerprint"] for row in self.profiler.top(2, by="calls")],
+            ["select * from users where id = ?", "select * from orders"])
+        self.assertEqual(self.profiler.top(1, by="rows")[0]["rows"], 100)
+
+    def test_report_and_reset(self):
+        """report() lists fingerprints; reset() forgets them"""
+        report = self.profiler.report(n=1)
+        self.assertEqual(len(report.splitlines()), 2)
+        self.assertIn("select * from orders", report)
+        self.profiler.reset()
+        self.assertEqual(self.profiler.top(), [])
+
+
+class TestLogQueries(unittest.TestCase):
+    """Test class for the log_queries decorator"""
+
+    def setUp(self):
+        """Keep records away from the background listener"""
+        patcher = patch.object(log_module, "_start_listener")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.profiler = QueryProfiler()
+
+    def test_calls_are_profiled(self):
+        """Every call is recorded; failures are logged as warnings"""
+        @log_module.log_queries(query_profiler=self.profiler,
+                                slow_ms=1000, sample_rate=0)
+        def run(query):
+            if "missing" in query:
+                raise LookupError(query)
+            return [(1,), (2,)]
+
+        with self.assertLogs("query_log", logging.WARNING) as logs:
+            run("SELECT * FROM users WHERE id = 1")
+            run(query="SELECT * FROM users WHERE id = 2")
+            with self.assertRaises(LookupError):
+                run("SELECT * FROM missing")
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("(failed)", logs.output[0])
+        users = self.profiler.top(by="calls")[0]
+        self.assertEqual((users["fingerprint"], users["calls"],
+                          users["rows"]),
+                         ("select * from users where id = ?", 2, 4))
+
+    def test_slow_calls_are_logged(self):
+        """Calls over slow_ms are logged with their fingerprint"""
+        @log_module.log_queries(query_profiler=self.profiler, slow_ms=0,
+                                sample_rate=0)
+        def run(query, params=None):
+            return []
+
+        with self.assertLogs("query_log", logging.WARNING) as logs:
+            run("SELECT * FROM users WHERE id = ?", (7,))
+        self.assertIn("select * from users where id = ? params=(7,)",
+                      logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the retry decorator in 3-retry_on_failure
+"""
+
+import asyncio
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+retry_module = __import__("3-retry_on_failure")
+RetryBudget = retry_module.RetryBudget
+retry_on_failure = retry_module.retry_on_failure
+
+
+def flaky(errors, result="ok"):
+    """
+    Return a function raising each of errors in turn, then result,
+    and the list its calls are counted in.
+    """
+    calls = []
+    errors = iter(errors)
+
+    def func():
+        calls.append(1)
+        error = next(errors, None)
+        if error is not None:
+            raise error
+        return result
+    return func, calls
+
+
+class TestIsTransient(unittest.TestCase):
+    """Test class for the default retry predicate"""
+
+    def test_is_transient(self):
+        """Only SQLite lock and busy errors are retryable"""
+        cases = [
+            (sqlite3.OperationalError("database is locked"), True),
+            (sqlite3.OperationalError("database table is BUSY"), True),
+            (sqlite3.OperationalError("no such table: users"), False),
+            (sqlite3.IntegrityError("database is locked"), False),
+            (ValueError("locked"), False),
+        ]
+        for error, expected in cases:
+            with self.subTest(error=error):
+                self.assertEqual(retry_module.is_transient(error), expected)
+
+
+class TestRetryOnFailure(unittest.TestCase):
+    """Test class for retry_on_failure"""
+
+    def setUp(self):
+        """Skip the backoff sleeps and silence the retry log"""
+        patcher = patch.object(retry_module.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(retry_module, "logger")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_transient_errors(self):
+        """Transient errors are retried until the call succeeds"""
+        func, calls = flaky([sqlite3.OperationalError("database is locked")]
+                            * 2)
+        wrapped = retry_on_failure(retries=3, budget=RetryBudget())(func)
+        self.assertEqual(wrapped(), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_gives_up_after_retries(self):
+        """The last error is raised once every attempt has failed"""
+        func, calls = flaky([sqlite3.OperationalError("database is locked")]
+                            * 5)
+        wrapped = retry_on_failure(retries=3, budget=RetryBudget())(func)
+        with self.assertRaises(sqlite3.OperationalError):
+            wrapped()
+        self.assertEqual(len(calls), 3)
+
+    def test_predicate_rejects_error(self):
+        """Errors the predicate rejects are raised on the first attempt"""
+        func, calls = flaky([sqlite3.OperationalError("no such table")])
+        wrapped = retry_on_failure(retries=3, budget=RetryBudget())(func)
+        with self.assertRaises(sqlite3.OperationalError):
+            wrapped()
+        self.assertEqual(len(calls), 1)
+        self.sleep.assert_not_called()
+
+    def test_custom_predicate(self):
+        """retry_if decides which errors are retried"""
+        func, calls = flaky([KeyError("a")])
+        wrapped = retry_on_failure(
+            retries=2, budget=RetryBudget(),
+            retry_if=lambda e: isinstance(e, KeyError))(func)
+        self.assertEqual(wrapped(), "ok")
+        self.assertEqual(len(calls), 2)
+
+    def test_budget_exhausted(self):
+        """No retries are made once the budget runs out"""
+        budget = RetryBudget(ratio=0, min_per_second=0, max_tokens=1)
+        error = sqlite3.OperationalError("database is locked")
+        func, calls = flaky([error] * 3)
+        wrapped = retry_on_failure(retries=5, budget=budget)(func)
+        with self.assertRaises(sqlite3.OperationalError):
+            wrapped()
+        self.assertEqual(len(calls), 2)  # one attempt, one retry
+        self.assertFalse(budget.try_spend())
+
+    def test_backoff_is_capped(self):
+        """Each wait is drawn from [0, min(max_delay, delay * 2 ** n)]"""
+        func, _ = flaky([sqlite3.OperationalError("database is locked")]
+                        * 4)
+        wrapped = retry_on_failure(retries=5, delay=1, max_delay=3,
+                                   budget=RetryBudget())(func)
+        with patch.object(retry_module.random, "uniform",
+                          side_effect=lambda lo, hi: hi):
+            wrapped()
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list],
+                         [1, 2, 3, 3])
+
+    def test_async_function(self):
+        """Coroutine functions are retried with asyncio.sleep"""
+        attempts = []
+
+        @retry_on_failure(retries=3, budget=RetryBudget())
+        async def fetch():
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise sqlite3.OperationalError("database is locked")
+            return "ok"
+
+        with patch.object(retry_module.asyncio, "sleep") as sleep:
+            self.assertEqual(asyncio.run(fetch()), "ok")
+        self.assertEqual(len(attempts), 2)
+        sleep.assert_awaited_once()
+
+    def test_invalid_retries(self):
+        """retries below 1 are rejected"""
+        for retries in (0, -1):
+            with self.subTest(retries=retries):
+                with self.assertRaises(ValueError):
+                    retry_on_failure(retries=retries)
+
+
+class TestRetryBudget(unittest.TestCase):
+    """Test class for RetryBudget"""
+
+    def test_calls_deposit_tokens(self):
+        """Each recorded call deposits ratio tokens, up to max_tokens"""
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=1)
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+        budget.record_call()
+        self.assertFalse(budget.try_spend())
+        budget.record_call()
+        self.assertTrue(budget.try_spend())
+
+    def test_tokens_trickle_in(self):
+        """min_per_second tokens are added over time"""
+        with patch.object(retry_module.time, "monotonic", return_value=0):
+            budget = RetryBudget(ratio=0, min_per_second=2, max_tokens=1)
+            self.assertTrue(budget.try_spend())
+            self.assertFalse(budget.try_spend())
+        with patch.object(retry_module.time, "monotonic", return_value=0.5):
+            self.assertTrue(budget.try_spend())
+
+
+if __name__ == "__main__":
+    unittest.main()
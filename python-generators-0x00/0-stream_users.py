@@ -2,16 +2,11 @@
 import seed
 
 
-def stream_users():
+def stream_users(chunk_size=seed.FETCH_SIZE):
     """
     Generator that streams rows from user_data one by one.
+    Rows are pulled from an unbuffered cursor chunk_size at a time.
     """
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data")
-
-    for row in cursor:
-        yield row
-
-    cursor.close()
-    connection.close()
+    for rows in seed.stream_rows("SELECT * FROM user_data",
+                                 chunk_size=chunk_size):
+        yield from rows
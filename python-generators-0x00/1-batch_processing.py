@@ -1,31 +1,49 @@
 #!/usr/bin/python3
 import seed
+from parallel_scan import parallel_batches
+from pipeline import Pipeline
 
 
-def stream_users_in_batches(batch_size):
+def stream_users_in_batches(batch_size, workers=None, ordered=False,
+                            columnar=False):
     """
     Generator that fetches rows in batches from user_data.
+    With workers set, user_id ranges are scanned by that many processes.
+    With columnar set, each batch is a columnar.ColumnBatch instead of a
+    list of dicts.
     """
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data")
+    if columnar:
+        if workers:
+            raise ValueError("columnar batches need a serial scan")
+        from columnar import stream_columns
+        yield from stream_columns(batch_size)
+        return
+    if workers:
+        yield from parallel_batches(batch_size, workers=workers,
+                                    ordered=ordered)
+        return
+    yield from seed.stream_rows("SELECT * FROM user_data",
+                                chunk_size=batch_size)
 
-    while True:
-        rows = cursor.fetchmany(batch_size)
-        if not rows:
-            break
-        yield rows
 
-    cursor.close()
-    connection.close()
-
-
-def batch_processing(batch_size):
+def batch_processing(batch_size, workers=None, ordered=False, sink=None):
     """
     Processes batches of users, filtering users over age 25.
+    The age filter runs in SQL, so only matching rows are fetched.
+    With workers set, the table is scanned in parallel processes.
+    With a sinks.Sink given, each batch is written to it in one call
+    instead of printing every user.
     """
-    for batch in stream_users_in_batches(batch_size):
+    over_25 = Pipeline().filter("age", ">", 25)
+    if workers:
+        batches = parallel_batches(batch_size, over_25, workers=workers,
+                                   ordered=ordered)
+    else:
+        batches = over_25.batches(batch_size)
+    for batch in batches:
+        if sink is not None:
+            sink.write_batch(batch)
+            continue
         for user in batch:
-            if user['age'] > 25:
-                print(user)
+            print(user)
     return 
\ No newline at end of file
@@ -1,26 +1,129 @@
 #!/usr/bin/python3
+import base64
+import json
+import queue
+import threading
 import seed
 
 
+class Page(list):
+    """A page of users carrying the token needed to resume after it."""
+
+    def __init__(self, rows, resume_token):
+        super().__init__(rows)
+        self.resume_token = resume_token
+
+
+def encode_resume_token(state):
+    """Pack pagination state into an opaque, URL-safe token."""
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_resume_token(token):
+    """Unpack a token produced by encode_resume_token."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError as e:
+        raise ValueError(f"Invalid resume token: {token!r}") from e
+
+
 def paginate_users(page_size, offset):
     """Fetch a page of users with given size and offset."""
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    cursor.close()
-    connection.close()
-    return rows
+    return seed.fetch_rows(
+        f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
+
+
+def paginate_users_after(page_size, last_user_id=None):
+    """Fetch the page of users ordered by user_id after last_user_id."""
+    if last_user_id is None:
+        return seed.fetch_rows(
+            "SELECT * FROM user_data ORDER BY user_id LIMIT %s",
+            (page_size,)
+        )
+    return seed.fetch_rows(
+        "SELECT * FROM user_data WHERE user_id > %s "
+        "ORDER BY user_id LIMIT %s",
+        (seed.encode_user_id(last_user_id), page_size)
+    )
 
 
-def lazy_pagination(page_size):
+def prefetched(pages, depth):
     """
-    Generator that lazily paginates through user_data.
+    Generator that runs the pages iterator on a background thread, keeping
+    up to depth pages fetched ahead of the consumer. Stopping early signals
+    the thread to finish after its current fetch.
     """
-    offset = 0
+    buffer = queue.Queue(depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch():
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((None, e))
+        finally:
+            pages.close()
+
+    worker = threading.Thread(target=fetch, daemon=True)
+    worker.start()
+    try:
+        while True:
+            page, error = buffer.get()
+            if error is not None:
+                raise error
+            if page is done:
+                break
+            yield page
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _pages(page_size, mode, state):
     while True:
-        page = paginate_users(page_size, offset)
+        if mode == "keyset":
+            page = paginate_users_after(page_size, state["after"])
+        else:
+            page = paginate_users(page_size, state["offset"])
         if not page:
             break
-        yield page
-        offset += page_size
+        state = dict(state, after=page[-1]["user_id"],
+                     offset=state["offset"] + len(page))
+        yield Page(page, encode_resume_token(state))
+
+
+def lazy_pagination(page_size, mode="keyset", resume_token=None, prefetch=0):
+    """
+    Generator that lazily paginates through user_data.
+    Keyset mode seeks by user_id so every page costs the same; offset mode
+    is kept for comparison. Each page exposes a resume_token that can be
+    passed back in to continue after that page. With prefetch set, up to
+    that many following pages are fetched in the background while the
+    current one is processed.
+    """
+    if mode not in ("keyset", "offset"):
+        raise ValueError(f"Unknown pagination mode: {mode!r}")
+    state = {"mode": mode, "after": None, "offset": 0}
+    if resume_token is not None:
+        state = decode_resume_token(resume_token)
+        if state.get("mode") != mode:
+            raise ValueError("Resume token was issued for another mode")
+
+    pages = _pages(page_size, mode, state)
+    if prefetch:
+        pages = prefetched(pages, prefetch)
+    yield from pages
@@ -2,27 +2,122 @@
 import seed
 
 
-def stream_user_ages():
+def stream_user_ages(chunk_size=seed.FETCH_SIZE):
     """Generator that yields ages of users one by one."""
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor()
-    cursor.execute("SELECT age FROM user_data")
+    for rows in seed.stream_rows("SELECT age FROM user_data",
+                                 chunk_size=chunk_size, dictionary=False):
+        for (age,) in rows:
+            yield age
 
-    for (age,) in cursor:
-        yield age
 
-    cursor.close()
-    connection.close()
+def stream_user_age_batches(batch_size=seed.FETCH_SIZE):
+    """Generator that yields lists of at most batch_size ages."""
+    for rows in seed.stream_rows("SELECT age FROM user_data",
+                                 chunk_size=batch_size, dictionary=False):
+        yield [age for (age,) in rows]
 
 
-def calculate_average_age():
-    """Compute average age using the generator (memory efficient)."""
+def calculate_age_statistics(batch_size=seed.FETCH_SIZE, fraction=None):
+    """
+    Compute age distribution statistics in one streaming pass.
+    With fraction set, only that share of user_id ranges is read (see
+    sampling.Sample); the distribution is estimated from the sample and
+    the user count is scaled up.
+    """
+    import stream_stats
+
+    if fraction is None:
+        batches = stream_user_age_batches(batch_size)
+        scale = 1
+    else:
+        from pipeline import Pipeline
+        from sampling import Sample
+
+        sample = Sample(fraction)
+        batches = ([float(row["age"]) for row in batch] for batch in
+                   sample.batches(batch_size, Pipeline().project("age")))
+        scale = 1 / sample.fraction
+    stats = stream_stats.summarize(batches)
+    summary = stats.summary()
+    if not stats.count:
+        print("No users found")
+        return summary
+    if scale == 1:
+        print(f"Users: {summary['count']}")
+    else:
+        print(f"Users: ~{summary['count'] * scale:.0f} "
+              f"(from a {1 / scale:.2%} sample)")
+    print(f"Average age: {summary['mean']:.2f} "
+          f"(std {summary['std']:.2f}, "
+          f"min {summary['min']:.0f}, max {summary['max']:.0f})")
+    for q, value in summary["quantiles"].items():
+        print(f"p{q * 100:g}: {value:.1f}")
+    return summary
+
+
+def _age_totals(mode, batch_size):
+    """Return (total, count) of ages, scanning in the given mode."""
     total = 0
     count = 0
+    if mode == "rows":
+        for age in stream_user_ages(batch_size):
+            total += age
+            count += 1
+    elif mode == "columnar":
+        from columnar import stream_columns
+        for batch in stream_columns(batch_size, columns=("age",)):
+            total += int(batch["age"].sum())
+            count += batch.num_rows
+    elif mode == "snapshot":
+        import snapshot
+        fresh = snapshot.current()
+        if fresh is None:
+            # No snapshot configured, or it is too old: scan the table.
+            return _age_totals("columnar", batch_size)
+        ages = fresh.column("age")
+        total = int(ages.sum())
+        count = len(ages)
+    elif mode == "aggregate":
+        connection = seed.connect_to_prodev()
+        try:
+            summary = seed.age_summary(connection)
+        finally:
+            connection.close()
+        count = summary["count"]
+        total = summary["mean"] * count if count else 0
+    else:
+        raise ValueError(f"Unknown mode: {mode!r}")
+    return total, count
+
+
+def calculate_average_age(mode="rows", batch_size=seed.FETCH_SIZE,
+                          fraction=None, confidence=0.95):
+    """
+    Compute average age using the generator (memory efficient).
+    mode="columnar" sums NumPy age columns instead of single rows;
+    mode="aggregate" reads the maintained age aggregates without a scan;
+    mode="snapshot" sums the memory-mapped age column of a fresh snapshot
+    (see snapshot.current), falling back to a columnar table scan;
+    mode="sample" estimates the average from a random fraction of user_id
+    ranges and prints a confidence interval.
+    """
+    if mode == "sample":
+        from sampling import DEFAULT_FRACTION, Sample
+
+        sample = Sample(fraction or DEFAULT_FRACTION)
+        mean = sample.estimate("age", confidence=confidence,
+                               batch_size=batch_size)["mean"]
+        if mean.value is None:
+            print("Average age of users: 0")
+        elif mean.low is None:
+            print(f"Average age of users: ~{mean.value:.2f}")
+        else:
+            print(f"Average age of users: ~{mean.value:.2f} "
+                  f"({confidence:.0%} CI {mean.low:.2f}-{mean.high:.2f}, "
+                  f"{sample.fraction:.2%} sample)")
+        return
 
-    for age in stream_user_ages():
-        total += age
-        count += 1
+    total, count = _age_totals(mode, batch_size)
 
     if count == 0:
         print("Average age of users: 0")
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+"""asyncio counterparts of the user_data streaming generators."""
+import asyncio
+import contextlib
+import functools
+import backends
+import seed
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+PREFETCH = 2
+
+
+class _SQLiteCursor:
+    """aiosqlite cursor with %s placeholders and optional dict rows."""
+
+    def __init__(self, connection, dictionary):
+        self._connection = connection
+        self._dictionary = dictionary
+        self._cursor = None
+
+    async def execute(self, query, params=None):
+        self._cursor = await self._connection.execute(
+            backends.to_qmark(query), params or ())
+
+    def _rows(self, rows):
+        if not self._dictionary:
+            return rows
+        names = [d[0] for d in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def fetchmany(self, size):
+        return self._rows(await self._cursor.fetchmany(size))
+
+    async def fetchall(self):
+        return self._rows(await self._cursor.fetchall())
+
+    async def close(self):
+        if self._cursor is not None:
+            await self._cursor.close()
+
+
+async def _connect():
+    """Open an async connection to the active seed backend."""
+    db_backend = seed.backend()
+    if db_backend.name == "sqlite":
+        import aiosqlite
+        connection = aiosqlite.connect(db_backend.path)
+        try:
+            return await connection
+        except Exception:
+            # aiosqlite stops its worker thread after a failed connect but
+            # does not wait for it; let it finish while the loop still runs.
+            await asyncio.to_thread(connection._thread.join, 1)
+            raise
+    import aiomysql
+    return await aiomysql.connect(db=db_backend.database,
+                                  **db_backend.server_config)
+
+
+async def _cursor(connection, dictionary=True, server_side=False):
+    """Open a cursor of the right kind for the connection's driver."""
+    if seed.backend().name == "sqlite":
+        return _SQLiteCursor(connection, dictionary)
+    import aiomysql
+    if server_side:
+        cursor_class = aiomysql.SSDictCursor if dictionary \
+            else aiomysql.SSCursor
+    else:
+        cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+    return await connection.cursor(cursor_class)
+
+
+async def _close(connection):
+    """Drop a connection without draining unread rows."""
+    if seed.backend().name == "sqlite":
+        await connection.close()
+    else:
+        connection.close()
+
+
+async def _prefetched(produce, prefetch):
+    """
+    Run produce(connection, put, compact) in a background task on its own
+    connection and yield what it puts. compact is seed.is_compact(),
+    resolved on a worker thread so the synchronous driver never blocks
+    the event loop. At most `prefetch` items are fetched ahead of the
+    consumer. When the consumer stops early or is cancelled, the task is
+    cancelled and its connection closed.
+    """
+    queue = asyncio.Queue(max(1, prefetch))
+
+    async def put(item):
+        await queue.put(("item", item))
+
+    async def run():
+        connection = None
+        try:
+            compact = await asyncio.to_thread(seed.is_compact)
+            connection = await _connect()
+            await produce(connection, put, compact)
+            await queue.put(("done", None))
+        except Exception as e:
+            await queue.put(("error", e))
+        finally:
+            if connection is not None:
+                await _close(connection)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            kind, item = await queue.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def _produce_chunks(connection, put, compact, query, chunk_size,
+                          dictionary):
+    cursor = await _cursor(connection, dictionary, server_side=True)
+    await cursor.execute(query)
+    names = [d[0] for d in cursor.description]
+    while True:
+        rows = await cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        await put(seed.decode_user_rows(list(rows), names, compact))
+    await cursor.close()
+
+
+def _stream_chunks(query, chunk_size, prefetch, dictionary=True):
+    produce = functools.partial(_produce_chunks, query=query,
+                                chunk_size=chunk_size, dictionary=dictionary)
+    return contextlib.aclosing(_prefetched(produce, prefetch))
+
+
+async def async_stream_users(chunk_size=seed.FETCH_SIZE, prefetch=PREFETCH):
+    """Async generator that streams rows from user_data one by one."""
+    async with _stream_chunks("SELECT * FROM user_data",
+                              chunk_size, prefetch) as chunks:
+        async for rows in chunks:
+            for row in rows:
+                yield row
+
+
+async def async_stream_users_in_batches(batch_size, prefetch=PREFETCH):
+    """Async generator that fetches rows in batches from user_data."""
+    async with _stream_chunks("SELECT * FROM user_data",
+                              batch_size, prefetch) as chunks:
+        async for rows in chunks:
+            yield rows
+
+
+async def async_stream_user_ages(chunk_size=seed.FETCH_SIZE,
+                                 prefetch=PREFETCH):
+    """Async generator that yields ages of users one by one."""
+    async with _stream_chunks("SELECT age FROM user_data", chunk_size,
+                              prefetch, dictionary=False) as chunks:
+        async for rows in chunks:
+            for (age,) in rows:
+                yield age
+
+
+async def _produce_pages(connection, put, compact, page_size, after,
+                         offset):
+    cursor = await _cursor(connection)
+    while True:
+        if after is None:
+            await cursor.execute(
+                "SELECT * FROM user_data ORDER BY user_id LIMIT %s",
+                (page_size,))
+        else:
+            await cursor.execute(
+                "SELECT * FROM user_data WHERE user_id > %s "
+                "ORDER BY user_id LIMIT %s",
+                (seed.encode_user_id(after, compact), page_size))
+        page = seed.decode_user_rows(
+            await cursor.fetchall(), [d[0] for d in cursor.description],
+            compact)
+        if not page:
+            break
+        after = page[-1]["user_id"]
+        offset += len(page)
+        token = lazy_paginate.encode_resume_token(
+            {"mode": "keyset", "after": after, "offset": offset})
+        await put(lazy_paginate.Page(page, token))
+    await cursor.close()
+
+
+async def async_lazy_pagination(page_size, resume_token=None,
+                                prefetch=PREFETCH):
+    """
+    Async generator that pages through user_data by user_id keyset.
+    Accepts and issues the same resume tokens as lazy_pagination's
+    keyset mode.
+    """
+    state = {"after": None, "offset": 0}
+    if resume_token is not None:
+        state = lazy_paginate.decode_resume_token(resume_token)
+        if state.get("mode") != "keyset":
+            raise ValueError("Resume token was issued for another mode")
+    produce = functools.partial(_produce_pages, page_size=page_size,
+                                after=state["after"], offset=state["offset"])
+    async with contextlib.aclosing(_prefetched(produce, prefetch)) as pages:
+        async for page in pages:
+            yield page
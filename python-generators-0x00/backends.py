@@ -0,0 +1,345 @@
+#!/usr/bin/python3
+"""Storage backends for the ALX_prodev user_data table."""
+import os
+import sqlite3
+
+
+class MySQLBackend:
+    """MySQL server reached through mysql-connector-python."""
+
+    name = "mysql"
+    user_table_sql = """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age DECIMAL NOT NULL,
+            INDEX(user_id),
+            UNIQUE INDEX idx_user_data_email (email)
+        )
+    """
+    compact_user_table_sql = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id BINARY(16) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age TINYINT UNSIGNED NOT NULL,
+            UNIQUE INDEX idx_user_data_email (email)
+        )
+    """
+    checkpoint_table_sql = """
+        CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+            source VARCHAR(512) PRIMARY KEY,
+            byte_offset BIGINT NOT NULL,
+            fingerprint CHAR(64) NOT NULL
+        )
+    """
+    aggregate_tables_sql = ("""
+        CREATE TABLE IF NOT EXISTS user_age_summary (
+            id TINYINT PRIMARY KEY,
+            users BIGINT NOT NULL,
+            age_sum BIGINT NOT NULL,
+            age_sum_sq BIGINT NOT NULL
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS user_age_histogram (
+            age INT PRIMARY KEY,
+            users BIGINT NOT NULL
+        )
+    """)
+
+    def __init__(self, host="localhost", user="root", password="root",
+                 database="ALX_prodev"):
+        import mysql.connector
+
+        self._connector = mysql.connector
+        self.errors = (mysql.connector.Error,)
+        self.server_config = {"host": host, "user": user,
+                              "password": password}
+        self.database = database
+
+    def connect_server(self):
+        """Connect without selecting a database."""
+        return self._connector.connect(**self.server_config)
+
+    def connect(self):
+        """Connect to the ALX_prodev database."""
+        return self._connector.connect(database=self.database,
+                                       **self.server_config)
+
+    def create_database(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        cursor.close()
+
+    def ensure_unique_index(self, connection, table, column):
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+              AND COLUMN_NAME = %s AND NON_UNIQUE = 0
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} "
+                           f"ADD UNIQUE INDEX idx_{table}_{column} ({column})")
+            connection.commit()
+        cursor.close()
+
+    def user_id_is_binary(self, connection):
+        """True/False for the user_data.user_id type, None if no table."""
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+              AND COLUMN_NAME = 'user_id'
+        """)
+        row = cursor.fetchone()
+        cursor.close()
+        return None if row is None else row[0].lower() == "binary"
+
+    def copy_to_compact(self, connection, source, target):
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            INSERT INTO {target} (user_id, name, email, age)
+            SELECT UNHEX(REPLACE(user_id, '-', '')), name, email, age
+            FROM {source}
+        """)
+        cursor.close()
+        connection.commit()
+
+    def swap_tables(self, connection, table, replacement, old_name):
+        cursor = connection.cursor()
+        cursor.execute(f"RENAME TABLE {table} TO {old_name}, "
+                       f"{replacement} TO {table}")
+        cursor.close()
+
+    def table_size(self, connection, table):
+        """Bytes used by table data and indexes."""
+        cursor = connection.cursor()
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+        cursor.execute("""
+            SELECT DATA_LENGTH + INDEX_LENGTH FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        size = cursor.fetchone()[0]
+        cursor.close()
+        return int(size)
+
+    def upsert_sql(self, table, columns, key, updates=None):
+        """
+        INSERT statement for columns that resolves conflicts on key.
+        updates maps column to an SQL expression in which `{column}` stands
+        for the incoming value; without updates existing rows are kept.
+        """
+        values = {column: f"VALUES({column})" for column in columns}
+        sets = ", ".join(f"{column} = {expr.format(**values)}"
+                         for column, expr in (updates or {}).items())
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {sets or f'{key} = {key}'}")
+
+
+class SQLiteCursor:
+    """
+    sqlite3 cursor speaking the subset of the mysql-connector cursor API the
+    generators use: %s placeholders and optional dict rows.
+    """
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, query, params=None):
+        self._cursor.execute(to_qmark(query), params or ())
+        return self
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(to_qmark(query), seq_of_params)
+        return self
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    def _rows(self, rows):
+        if not self._dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return row if row is None else self._rows([row])[0]
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection with mysql-connector style cursor() and ping()."""
+
+    unread_result = False
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._connection.cursor(), dictionary)
+
+    def ping(self, reconnect=False):
+        self._connection.execute("SELECT 1")
+
+
+class SQLiteBackend:
+    """Single-file SQLite database, for local runs and benchmarks."""
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+    user_table_sql = """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            age INTEGER NOT NULL
+        )
+    """
+    # The email index is added once the table has its final name, because
+    # SQLite index names are global to the database.
+    compact_user_table_sql = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id BLOB PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            age INTEGER NOT NULL
+        )
+    """
+    checkpoint_table_sql = """
+        CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+            source TEXT PRIMARY KEY,
+            byte_offset INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL
+        )
+    """
+    aggregate_tables_sql = ("""
+        CREATE TABLE IF NOT EXISTS user_age_summary (
+            id INTEGER PRIMARY KEY,
+            users INTEGER NOT NULL,
+            age_sum INTEGER NOT NULL,
+            age_sum_sq INTEGER NOT NULL
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS user_age_histogram (
+            age INTEGER PRIMARY KEY,
+            users INTEGER NOT NULL
+        )
+    """)
+
+    def __init__(self, path="ALX_prodev.db"):
+        self.path = path
+
+    def connect_server(self):
+        return self.connect()
+
+    def connect(self):
+        return SQLiteConnection(self.path)
+
+    def create_database(self, connection):
+        """The database file is created on first connect."""
+
+    def ensure_unique_index(self, connection, table, column):
+        connection.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS "
+                           f"idx_{table}_{column} ON {table} ({column})")
+        connection.commit()
+
+    def user_id_is_binary(self, connection):
+        """See MySQLBackend.user_id_is_binary."""
+        columns = {row[1]: row[2] for row in connection.execute(
+            "PRAGMA table_info(user_data)")}
+        if "user_id" not in columns:
+            return None
+        return columns["user_id"].upper() == "BLOB"
+
+    def copy_to_compact(self, connection, source, target):
+        # unhex() only exists from SQLite 3.41, so convert in Python.
+        rows = connection.execute(
+            f"SELECT user_id, name, email, age FROM {source}")
+        writer = connection.cursor()
+        while True:
+            batch = rows.fetchmany(10000)
+            if not batch:
+                break
+            writer.executemany(
+                f"INSERT INTO {target} (user_id, name, email, age) "
+                f"VALUES (?, ?, ?, ?)",
+                [(bytes.fromhex(user_id.replace("-", "")), name, email,
+                  int(age)) for user_id, name, email, age in batch])
+        connection.commit()
+
+    def swap_tables(self, connection, table, replacement, old_name):
+        # Index names are global, so free ours for the replacement table.
+        for (index,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND tbl_name = ? AND name LIKE 'idx_%'", (table,)).fetchall():
+            connection.execute(f"DROP INDEX {index}")
+        connection.execute(f"ALTER TABLE {table} RENAME TO {old_name}")
+        connection.execute(f"ALTER TABLE {replacement} RENAME TO {table}")
+
+    def table_size(self, connection, table):
+        """
+        Bytes used by table data and indexes. Needs SQLite built with
+        SQLITE_ENABLE_DBSTAT.
+        """
+        (size,) = connection.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE tbl_name = ?)",
+            (table,)).fetchone()
+        return size
+
+    def upsert_sql(self, table, columns, key, updates=None):
+        """See MySQLBackend.upsert_sql."""
+        values = {column: f"excluded.{column}" for column in columns}
+        sets = ", ".join(f"{column} = {expr.format(**values)}"
+                         for column, expr in (updates or {}).items())
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT({key}) "
+                + (f"DO UPDATE SET {sets}" if sets else "DO NOTHING"))
+
+
+def to_qmark(query):
+    """Rewrite %s placeholders as sqlite3's ?."""
+    return query.replace("%s", "?")
+
+
+BACKENDS = {"mysql": MySQLBackend, "sqlite": SQLiteBackend}
+
+
+def from_env():
+    """
+    Build the backend named by ALX_DB_BACKEND (default mysql).
+    ALX_SQLITE_PATH sets the database file for the sqlite backend.
+    """
+    name = os.environ.get("ALX_DB_BACKEND", "mysql")
+    if name == "sqlite":
+        return SQLiteBackend(os.environ.get("ALX_SQLITE_PATH",
+                                            "ALX_prodev.db"))
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name!r}")
+    return BACKENDS[name]()
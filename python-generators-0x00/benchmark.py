@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+"""Benchmarks for the user_data streaming generators."""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+import backends
+import seed
+
+stream_users = __import__('0-stream_users').stream_users
+batch_processing = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+def ensure_rows(rows):
+    """Create user_data and fill it with synthetic users up to `rows`."""
+    connection = seed.connect_db()
+    seed.create_database(connection)
+    connection.close()
+    connection = seed.connect_to_prodev()
+    seed.create_table(connection)
+    added = seed.populate(connection, rows)
+    if added:
+        print(f"Added {added} synthetic users")
+    connection.close()
+
+
+def bench_pagination(args):
+    """Walk the whole table in keyset and offset mode and time both."""
+    ensure_rows(args.rows)
+    for mode in ("keyset", "offset"):
+        start = time.perf_counter()
+        total = 0
+        for page in lazy_paginate.lazy_pagination(args.page_size, mode=mode):
+            total += len(page)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>7}: {total} rows in {elapsed:.2f}s "
+              f"({total / elapsed:.0f} rows/s)")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def scan_rows(rows, buffered, chunk_size):
+    """Stream the first `rows` rows and return (count, peak RSS MiB)."""
+    count = 0
+    for chunk in seed.stream_rows(f"SELECT * FROM user_data LIMIT {rows}",
+                                  chunk_size=chunk_size, buffered=buffered):
+        count += len(chunk)
+    return count, peak_rss_mb()
+
+
+def bench_memory(args):
+    """Compare peak RSS of buffered and unbuffered full scans."""
+    if args.child:
+        count, rss = scan_rows(args.rows[0], args.child == "buffered",
+                               args.chunk_size)
+        print(f"{count} {rss:.1f}")
+        return
+    ensure_rows(max(args.rows))
+    for rows in args.rows:
+        for mode in ("unbuffered", "buffered"):
+            # A fresh process per run so ru_maxrss is not shared.
+            out = subprocess.run(
+                [sys.executable, __file__, "memory", "--child", mode,
+                 "--chunk-size", str(args.chunk_size), "--rows", str(rows)],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            print(f"{mode:>10} {int(out[0]):>10} rows: "
+                  f"peak RSS {float(out[1]):.1f} MiB")
+
+
+def _scan_seconds():
+    start = time.perf_counter()
+    rows = _count_batches(seed.stream_rows("SELECT * FROM user_data",
+                                           chunk_size=10000))
+    return rows, time.perf_counter() - start
+
+
+def bench_schema(args):
+    """Table size and full-scan time before and after the compact schema."""
+    ensure_rows(args.rows)
+    connection = seed.connect_to_prodev()
+    db_backend = seed.backend()
+    for label in ("before", "after"):
+        if label == "after":
+            seed.migrate_to_compact(connection)
+        size = db_backend.table_size(connection, "user_data")
+        rows, elapsed = _scan_seconds()
+        print(f"{label:>6}: {size / 2 ** 20:8.1f} MiB, full scan of "
+              f"{rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+    connection.close()
+
+
+def _count_rows(items):
+    return sum(1 for _ in items)
+
+
+def _count_batches(batches):
+    return sum(len(batch) for batch in batches)
+
+
+STRATEGIES = {
+    "stream_users":
+        lambda size: _count_rows(stream_users(size)),
+    "stream_users_in_batches":
+        lambda size: _count_batches(
+            batch_processing.stream_users_in_batches(size)),
+    "columnar_batches":
+        lambda size: sum(batch.num_rows for batch in
+                         batch_processing.stream_users_in_batches(
+                             size, columnar=True)),
+    "lazy_pagination":
+        lambda size: _count_batches(lazy_paginate.lazy_pagination(size)),
+    "lazy_pagination_prefetch":
+        lambda size: _count_batches(
+            lazy_paginate.lazy_pagination(size, prefetch=2)),
+    "lazy_pagination_offset":
+        lambda size: _count_batches(
+            lazy_paginate.lazy_pagination(size, mode="offset")),
+}
+
+
+def bench_run(args):
+    """Time every streaming strategy at every batch size."""
+    if args.child:
+        start = time.perf_counter()
+        rows = STRATEGIES[args.child](args.batch_sizes[0])
+        elapsed = time.perf_counter() - start
+        print(f"{rows} {elapsed} {peak_rss_mb()}")
+        return
+    ensure_rows(args.rows)
+    print(f"{'strategy':<24}{'batch':>8}{'rows':>10}{'seconds':>10}"
+          f"{'rows/s':>12}{'peak MiB':>10}")
+    for strategy in args.strategies:
+        for size in args.batch_sizes:
+            out = subprocess.run(
+                [sys.executable, __file__, "run", "--child", strategy,
+                 "--batch-sizes", str(size)],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            rows, elapsed, rss = int(out[0]), float(out[1]), float(out[2])
+            print(f"{strategy:<24}{size:>8}{rows:>10}{elapsed:>10.2f}"
+                  f"{rows / elapsed:>12.0f}{rss:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=sorted(backends.BACKENDS),
+                        help="storage backend (default: $ALX_DB_BACKEND)")
+    parser.add_argument("--sqlite-path",
+                        help="database file for the sqlite backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="wall time, rows/s and peak memory "
+                                     "of each streaming strategy")
+    run.add_argument("--rows", type=int, default=1_000_000)
+    run.add_argument("--batch-sizes", type=int, nargs="+",
+                     default=[100, 1000, 10000])
+    run.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES),
+                     default=sorted(STRATEGIES))
+    run.add_argument("--child", choices=sorted(STRATEGIES),
+                     help=argparse.SUPPRESS)
+    run.set_defaults(func=bench_run)
+
+    pagination = sub.add_parser("pagination",
+                                help="keyset vs offset lazy_pagination")
+    pagination.add_argument("--rows", type=int, default=1_000_000)
+    pagination.add_argument("--page-size", type=int, default=1000)
+    pagination.set_defaults(func=bench_pagination)
+
+    memory = sub.add_parser("memory",
+                            help="peak RSS of buffered vs unbuffered scans")
+    memory.add_argument("--rows", type=int, nargs="+",
+                        default=[100_000, 1_000_000])
+    memory.add_argument("--chunk-size", type=int, default=seed.FETCH_SIZE)
+    memory.add_argument("--child", choices=("buffered", "unbuffered"),
+                        help=argparse.SUPPRESS)
+    memory.set_defaults(func=bench_memory)
+
+    schema = sub.add_parser("schema", help="migrate to the compact schema "
+                                           "and compare size and scan speed")
+    schema.add_argument("--rows", type=int, default=1_000_000)
+    schema.set_defaults(func=bench_schema)
+
+    args = parser.parse_args()
+    # Environment, not seed.use_backend, so child processes inherit it.
+    if args.backend:
+        os.environ["ALX_DB_BACKEND"] = args.backend
+    if args.sqlite_path:
+        os.environ["ALX_SQLITE_PATH"] = args.sqlite_path
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
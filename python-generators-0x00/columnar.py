@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+"""Column-oriented record batches for user_data scans."""
+import numpy as np
+import seed
+
+NUMERIC_COLUMNS = {"age": np.int64}
+
+
+class ColumnBatch(dict):
+    """
+    Mapping of column name to column values for one batch of rows.
+    Numeric columns are NumPy arrays; text columns are plain lists.
+    """
+
+    def __init__(self, columns, num_rows):
+        super().__init__(columns)
+        self.num_rows = num_rows
+
+
+def to_columns(names, rows):
+    """Transpose a list of row tuples into a ColumnBatch."""
+    batch = {}
+    for name, values in zip(names, zip(*rows)):
+        if name in NUMERIC_COLUMNS:
+            batch[name] = np.fromiter(values, NUMERIC_COLUMNS[name],
+                                      count=len(rows))
+        else:
+            batch[name] = list(values)
+    return ColumnBatch(batch, len(rows))
+
+
+def stream_columns(batch_size=seed.FETCH_SIZE, columns=seed.USER_COLUMNS):
+    """
+    Generator that yields user_data as ColumnBatch objects.
+    A fresh snapshot (see snapshot.current) is read instead of the
+    database when one is configured.
+    """
+    import snapshot
+
+    fresh = snapshot.current()
+    if fresh is not None:
+        yield from fresh.batches(batch_size, columns)
+        return
+    query = f"SELECT {', '.join(columns)} FROM user_data"
+    for rows in seed.stream_rows(query, chunk_size=batch_size,
+                                 dictionary=False):
+        yield to_columns(columns, rows)
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""Resumable, checkpointed export of user_data."""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import seed
+from sinks import open_sink
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+CHECKPOINT_INTERVAL = 5.0
+RETRIES = 8
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+class ExportJob:
+    """
+    Exports user_data to a file in user_id order through a sinks.Sink.
+    Every checkpoint_interval seconds the sink is synced and the pagination
+    resume token and byte offset are written to `<path>.checkpoint`.
+    A run that finds a checkpoint truncates the file to the recorded offset
+    and continues after the recorded key, so rows are neither duplicated
+    nor skipped. Lost connections are retried with capped exponential
+    backoff from the last written page.
+    """
+
+    def __init__(self, path, batch_size=1000, format=None, compression=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, retries=RETRIES):
+        if path is None or path == "-":
+            raise ValueError("A resumable export needs an output file")
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.batch_size = batch_size
+        self.format = format
+        self.compression = compression
+        self.checkpoint_interval = checkpoint_interval
+        self.retries = retries
+
+    def load_checkpoint(self):
+        """The saved checkpoint, or None when starting fresh."""
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_checkpoint(self, state):
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def _checkpoint(self, sink, state, complete=False):
+        state.update(offset=sink.sync(), complete=complete)
+        self._save_checkpoint(state)
+
+    def _restore(self):
+        state = self.load_checkpoint()
+        options = {"format": self.format, "compression": self.compression}
+        if state is None:
+            state = dict(options, resume_token=None, offset=0, rows=0,
+                         complete=False)
+        elif {k: state[k] for k in options} != options:
+            raise ValueError(f"{self.checkpoint_path} was written with "
+                             f"different options: {state}")
+        size = os.path.getsize(self.path) \
+            if os.path.exists(self.path) else 0
+        if size < state["offset"]:
+            raise ValueError(f"{self.path} is shorter than its checkpoint "
+                             f"({size} < {state['offset']} bytes)")
+        if not state["complete"]:
+            with open(self.path, "ab") as f:
+                f.truncate(state["offset"])
+        return state
+
+    def run(self):
+        """Run or resume the export. Returns the final checkpoint state."""
+        state = self._restore()
+        if state["complete"]:
+            return state
+        errors = seed.backend().errors + (seed.PoolError,)
+        attempt = 0
+        with open_sink(self.path, self.format, self.compression,
+                       append=True) as sink:
+            last_checkpoint = time.monotonic()
+            while True:
+                try:
+                    for page in lazy_paginate.lazy_pagination(
+                            self.batch_size,
+                            resume_token=state["resume_token"]):
+                        sink.write_batch(page)
+                        state.update(resume_token=page.resume_token,
+                                     rows=state["rows"] + len(page))
+                        attempt = 0
+                        now = time.monotonic()
+                        if now - last_checkpoint >= self.checkpoint_interval:
+                            self._checkpoint(sink, state)
+                            last_checkpoint = now
+                    break
+                except errors as e:
+                    attempt += 1
+                    self._checkpoint(sink, state)
+                    if attempt > self.retries:
+                        raise
+                    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1)
+                    print(f"Export interrupted ({e}); retry {attempt} of "
+                          f"{self.retries} in {delay:.1f}s", file=sys.stderr)
+                    time.sleep(delay)
+            self._checkpoint(sink, state, complete=True)
+        return state
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export user_data to a file, resuming from the last "
+                    "checkpoint after a failure.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("ndjson", "csv"))
+    parser.add_argument("--compression", choices=("gzip", "zstd"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint-interval", type=float,
+                        default=CHECKPOINT_INTERVAL)
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    args = parser.parse_args()
+
+    job = ExportJob(args.path, args.batch_size, args.format,
+                    args.compression, args.checkpoint_interval, args.retries)
+    resumed = job.load_checkpoint()
+    if resumed and not resumed["complete"]:
+        print(f"Resuming after {resumed['rows']} rows", file=sys.stderr)
+    state = job.run()
+    print(f"Exported {state['rows']} rows to {args.path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""Feed one user_data scan to several consumers."""
+import argparse
+import queue
+import threading
+
+QUEUE_SIZE = 2
+_END = object()
+
+
+class _Branch:
+    """One consumer running on its own thread behind a bounded queue."""
+
+    def __init__(self, name, consumer, queue_size, stop):
+        self.name = name
+        self.queue = queue.Queue(queue_size)
+        self.finished = threading.Event()
+        self.result = None
+        self.error = None
+        self._consumer = consumer
+        self._stop = stop
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"fanout-{name}")
+
+    def _batches(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _END:
+                return
+            yield batch
+
+    def _run(self):
+        try:
+            self.result = self._consumer(self._batches())
+        except BaseException as e:
+            self.error = e
+            self._stop.set()
+        finally:
+            self.finished.set()
+
+    def put(self, item):
+        """
+        Block until the consumer has room for item. Returns False if the
+        consumer has finished or the fan-out is stopping.
+        """
+        while not self.finished.is_set() and not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def start(self):
+        self._thread.start()
+
+    def finish(self):
+        """Signal the end of the batches and wait for the consumer."""
+        while not self.finished.is_set():
+            try:
+                self.queue.put(_END, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+
+
+class FanOut:
+    """
+    Drives one iterator of batches and hands every batch to each
+    registered consumer. A consumer is a callable taking an iterator of
+    batches; it runs on its own thread and its return value is reported
+    under its name. Each consumer has a queue of queue_size batches, so
+    the scan runs at most that far ahead of the slowest consumer.
+    Batches are shared between consumers and must not be modified.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._consumers = {}
+
+    def add(self, name, consumer):
+        """Register consumer under name. Returns self for chaining."""
+        if name in self._consumers:
+            raise ValueError(f"Consumer already registered: {name!r}")
+        self._consumers[name] = consumer
+        return self
+
+    def run(self, batches):
+        """
+        Feed batches to all consumers and wait for them to finish.
+        Returns a dict of consumer name to result. The scan stops early once
+        every consumer has returned; if a consumer raises, the scan stops
+        and the first error is re-raised.
+        """
+        stop = threading.Event()
+        branches = [_Branch(name, consumer, self.queue_size, stop)
+                    for name, consumer in self._consumers.items()]
+        for branch in branches:
+            branch.start()
+        try:
+            for batch in batches:
+                delivered = [branch.put(batch) for branch in branches]
+                if stop.is_set() or not any(delivered):
+                    break
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+            for branch in branches:
+                branch.finish()
+        for branch in branches:
+            if branch.error is not None:
+                raise branch.error
+        return {branch.name: branch.result for branch in branches}
+
+
+def fan_out(batch_size, consumers, queue_size=QUEUE_SIZE, **scan_options):
+    """
+    Scan user_data once with stream_users_in_batches and feed every batch
+    to each consumer in the consumers dict. scan_options (workers, ordered)
+    are passed to the scan. Returns a dict of consumer name to result.
+    """
+    batch_processing = __import__('1-batch_processing')
+
+    fan = FanOut(queue_size)
+    for name, consumer in consumers.items():
+        fan.add(name, consumer)
+    return fan.run(batch_processing.stream_users_in_batches(
+        batch_size, **scan_options))
+
+
+def where(predicate, consumer):
+    """Wrap consumer so it only sees rows for which predicate(row) holds."""
+    def filtered(batches):
+        return consumer([row for row in batch if predicate(row)]
+                        for batch in batches)
+    return filtered
+
+
+def age_totals(batches):
+    """Consumer returning (total, count) of the age column."""
+    total = 0
+    count = 0
+    for batch in batches:
+        total += sum(row["age"] for row in batch)
+        count += len(batch)
+    return total, count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export users over an age and report age statistics "
+                    "from a single scan.")
+    parser.add_argument("path", help="export file, - for stdout")
+    parser.add_argument("--min-age", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    import stream_stats
+    from sinks import open_sink
+
+    def export(batches):
+        with open_sink(args.path) as sink:
+            for batch in batches:
+                sink.write_batch(batch)
+            return sink.rows
+
+    def statistics(batches):
+        return stream_stats.summarize(
+            [float(row["age"]) for row in batch] for batch in batches
+        ).summary()
+
+    results = fan_out(args.batch_size, {
+        "export": where(lambda row: row["age"] > args.min_age, export),
+        "average": age_totals,
+        "statistics": statistics,
+    }, workers=args.workers)
+    total, count = results["average"]
+    print(f"Exported {results['export']} users over {args.min_age}")
+    print(f"Average age of users: {total / count if count else 0:.2f}")
+    if count:
+        print(f"Median age: {results['statistics']['quantiles'][0.5]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
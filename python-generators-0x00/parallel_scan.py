@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""Parallel scan of user_data split into user_id ranges."""
+import multiprocessing
+import os
+import queue as queue_module
+import seed
+from pipeline import Pipeline
+
+POLL_INTERVAL = 1.0
+
+
+def partition_pipeline(pipeline, lo, hi):
+    """Restrict pipeline to user_ids in [lo, hi); None leaves a side open."""
+    ranged = Pipeline(pipeline.table)
+    if lo is not None:
+        ranged = ranged.filter("user_id", ">=", lo)
+    if hi is not None:
+        ranged = ranged.filter("user_id", "<", hi)
+    return Pipeline(pipeline.table, ranged.steps + pipeline.steps)
+
+
+def _scan_partitions(pipeline, partitions, batch_size, queues):
+    """Worker: stream each assigned partition into its result queue."""
+    for index, (lo, hi) in partitions:
+        queue = queues[index]
+        try:
+            ranged = partition_pipeline(pipeline, lo, hi)
+            for batch in ranged.batches(batch_size):
+                queue.put(("rows", batch))
+        except Exception as e:
+            queue.put(("error", f"partition {index}: {e!r}"))
+            return
+        queue.put(("done", None))
+
+
+def _drain(queue, partitions, processes):
+    """
+    Yield batches from queue until `partitions` partitions finished.
+    Raises RuntimeError if a worker dies without reporting, rather than
+    waiting forever for a partition that will never finish.
+    """
+    while partitions:
+        try:
+            kind, payload = queue.get(timeout=POLL_INTERVAL)
+        except queue_module.Empty:
+            for process in processes:
+                if process.exitcode not in (None, 0):
+                    raise RuntimeError(
+                        f"Parallel scan worker {process.pid} died "
+                        f"with exit code {process.exitcode}") from None
+            if any(process.is_alive() for process in processes):
+                continue
+            # The workers may have sent their last batches and exited
+            # after the timeout; anything they sent is in the queue now.
+            try:
+                kind, payload = queue.get_nowait()
+            except queue_module.Empty:
+                raise RuntimeError("Parallel scan workers exited with "
+                                   f"{partitions} partitions unfinished") \
+                    from None
+        if kind == "rows":
+            yield payload
+        elif kind == "done":
+            partitions -= 1
+        else:
+            raise RuntimeError(f"Parallel scan failed in {payload}")
+
+
+def parallel_batches(batch_size, pipeline=None, workers=None,
+                     partitions=None, ordered=False, queue_size=4):
+    """
+    Generator that scans user_data in parallel worker processes.
+    The table is split into user_id ranges (by default one per worker);
+    each worker scans its ranges over its own pooled connection. With
+    ordered=True batches come back in user_id range order, otherwise in
+    whatever order workers produce them. Each queue holds at most
+    queue_size batches per partition, so fast workers wait for the consumer.
+    """
+    pipeline = pipeline or Pipeline()
+    if any(step[0] == "limit" for step in pipeline.steps):
+        raise ValueError("limit() is not supported in a parallel scan")
+    workers = workers or os.cpu_count() or 1
+    ranges = list(enumerate(seed.user_id_ranges(partitions or workers)))
+    workers = min(workers, len(ranges))
+
+    context = multiprocessing.get_context()
+    if ordered:
+        queues = [context.Queue(queue_size) for _ in ranges]
+    else:
+        queues = [context.Queue(queue_size * workers)] * len(ranges)
+    processes = [
+        context.Process(target=_scan_partitions, daemon=True,
+                        args=(pipeline, ranges[w::workers], batch_size,
+                              queues))
+        for w in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        if ordered:
+            for queue in queues:
+                yield from _drain(queue, 1, processes)
+        else:
+            yield from _drain(queues[0], len(ranges), processes)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+"""Composable batch pipelines over user_data with SQL pushdown."""
+import operator
+import re
+import seed
+
+COLUMN_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+OPERATORS = {
+    "=": ("=", operator.eq),
+    "==": ("=", operator.eq),
+    "!=": ("<>", operator.ne),
+    "<": ("<", operator.lt),
+    "<=": ("<=", operator.le),
+    ">": (">", operator.gt),
+    ">=": (">=", operator.ge),
+    "in": ("IN", lambda value, options: value in options),
+}
+
+
+def _check_column(column):
+    if not COLUMN_RE.match(column):
+        raise ValueError(f"Invalid column name: {column!r}")
+    return column
+
+
+class Pipeline:
+    """
+    Immutable chain of filter/project/map/limit steps over a table.
+    Leading column predicates, projections and limits are compiled into the
+    SQL WHERE/SELECT/LIMIT so only the needed rows and columns are read;
+    everything from the first step that cannot be expressed in SQL onwards
+    runs in Python on each batch.
+
+    Example: Pipeline().filter("age", ">", 25).project("name").limit(10)
+    """
+
+    def __init__(self, table="user_data", steps=()):
+        self.table = _check_column(table)
+        self.steps = tuple(steps)
+
+    def _then(self, *step):
+        return Pipeline(self.table, self.steps + (step,))
+
+    def filter(self, column, op=None, value=None):
+        """Keep rows where `column op value`, or where column(row) is true."""
+        if callable(column):
+            return self._then("call", column)
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        return self._then("where", _check_column(column), op, value)
+
+    def project(self, *columns):
+        """Keep only the given columns."""
+        return self._then("project", tuple(map(_check_column, columns)))
+
+    def map(self, func):
+        """Transform each row with func."""
+        return self._then("map", func)
+
+    def limit(self, count):
+        """Stop after count rows."""
+        return self._then("limit", int(count))
+
+    def compile(self):
+        """Return (sql, params, residual steps left for Python)."""
+        columns, where, params, limit = None, [], [], None
+        for i, step in enumerate(self.steps):
+            kind = step[0]
+            if kind == "where" and limit is None:
+                _, column, op, value = step
+                if columns is not None and column not in columns:
+                    raise ValueError(f"Column {column!r} was projected away")
+                sql_op = OPERATORS[op][0]
+                if column == "user_id":
+                    value = [seed.encode_user_id(v) for v in value] \
+                        if sql_op == "IN" else seed.encode_user_id(value)
+                if sql_op == "IN":
+                    value = list(value)
+                    marks = ", ".join(["%s"] * len(value)) or "NULL"
+                    where.append(f"{column} IN ({marks})")
+                    params.extend(value)
+                else:
+                    where.append(f"{column} {sql_op} %s")
+                    params.append(value)
+            elif kind == "project":
+                if columns is not None and not set(step[1]) <= set(columns):
+                    raise ValueError("Cannot project columns already dropped")
+                columns = step[1]
+            elif kind == "limit":
+                limit = step[1] if limit is None else min(limit, step[1])
+            else:
+                residual = self.steps[i:]
+                break
+        else:
+            residual = ()
+
+        sql = f"SELECT {', '.join(columns) if columns else '*'} " \
+              f"FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if limit is not None:
+            sql += f" LIMIT {limit}"
+        return sql, tuple(params), residual
+
+    def batches(self, batch_size=seed.FETCH_SIZE):
+        """Generator that yields lists of processed rows."""
+        sql, params, residual = self.compile()
+        stream = seed.stream_rows(sql, params or None, chunk_size=batch_size)
+        if not residual:
+            yield from stream
+            return
+
+        taken = [0] * len(residual)
+        try:
+            for rows in stream:
+                out, exhausted = _apply(residual, rows, taken)
+                if out:
+                    yield out
+                if exhausted:
+                    break
+        finally:
+            stream.close()
+
+    def __iter__(self):
+        for rows in self.batches():
+            yield from rows
+
+
+def _apply(steps, rows, taken):
+    """Run Python-side steps over rows; report whether a limit ran out."""
+    out = []
+    exhausted = False
+    for row in rows:
+        last = False
+        for i, step in enumerate(steps):
+            kind = step[0]
+            if kind == "call":
+                if not step[1](row):
+                    break
+            elif kind == "where":
+                _, column, op, value = step
+                if not OPERATORS[op][1](row[column], value):
+                    break
+            elif kind == "project":
+                row = {column: row[column] for column in step[1]}
+            elif kind == "map":
+                row = step[1](row)
+            elif kind == "limit":
+                if taken[i] >= step[1]:
+                    exhausted = True
+                    break
+                taken[i] += 1
+                last = last or taken[i] >= step[1]
+        else:
+            out.append(row)
+        if exhausted or last:
+            return out, True
+    return out, exhausted
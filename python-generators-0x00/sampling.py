@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""Approximate user_data analytics from a random sample of user_id ranges."""
+import math
+import random
+import statistics
+from collections import namedtuple
+import seed
+from parallel_scan import partition_pipeline
+from pipeline import Pipeline
+
+SLICES = 4096
+DEFAULT_FRACTION = 0.01
+
+Estimate = namedtuple("Estimate", "value low high")
+
+
+def _z(confidence):
+    return statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def _interval(value, stderr, z):
+    return Estimate(value, value - z * stderr, value + z * stderr)
+
+
+class Sample:
+    """
+    A random subset of the user_id key space. The hex prefix space is cut
+    into `slices` equal slices and round(fraction * slices) of them are
+    picked at random (adjacent picks are scanned as one range). user_ids
+    are random UUIDs, so every row lands in the sample independently with
+    probability `self.fraction`, and estimates scale by it.
+    """
+
+    def __init__(self, fraction=DEFAULT_FRACTION, random_seed=None,
+                 slices=SLICES):
+        if not 0 < fraction <= 1:
+            raise ValueError("fraction must be in (0, 1]")
+        picked = max(1, round(fraction * slices))
+        rng = random.Random(random_seed)
+        chosen = sorted(rng.sample(range(slices), picked))
+        self.fraction = picked / slices
+        self.ranges = []
+        for i in chosen:
+            lo = None if i == 0 else f"{i * 16 ** 8 // slices:08x}"
+            hi = None if i + 1 == slices \
+                else f"{(i + 1) * 16 ** 8 // slices:08x}"
+            if self.ranges and self.ranges[-1][1] == lo:
+                self.ranges[-1] = (self.ranges[-1][0], hi)
+            else:
+                self.ranges.append((lo, hi))
+
+    def batches(self, batch_size=seed.FETCH_SIZE, pipeline=None):
+        """Generator that yields the pipeline's batches for sampled rows."""
+        pipeline = pipeline or Pipeline()
+        for lo, hi in self.ranges:
+            yield from partition_pipeline(pipeline, lo, hi).batches(
+                batch_size)
+
+    def estimate(self, column, pipeline=None, confidence=0.95,
+                 batch_size=seed.FETCH_SIZE):
+        """
+        Estimate count, mean and total of a numeric column over the rows
+        the pipeline selects. Returns a dict of Estimate tuples (value and
+        normal-approximation confidence bounds) plus the sampled row count.
+        """
+        pipeline = (pipeline or Pipeline()).project(column)
+        n = 0
+        total = 0.0
+        total_sq = 0.0
+        for batch in self.batches(batch_size, pipeline):
+            for row in batch:
+                value = float(row[column])
+                total += value
+                total_sq += value * value
+            n += len(batch)
+
+        f = self.fraction
+        z = _z(confidence)
+        # Bernoulli sampling: each row is kept with probability f.
+        count = _interval(n / f, math.sqrt(n * (1 - f)) / f, z)
+        sum_ = _interval(total / f, math.sqrt(total_sq * (1 - f)) / f, z)
+        if n > 1:
+            mean = total / n
+            variance = (total_sq - n * mean * mean) / (n - 1)
+            stderr = math.sqrt(max(variance, 0) / n * (1 - f))
+            mean = _interval(mean, stderr, z)
+        else:
+            mean = Estimate(total / n if n else None, None, None)
+        return {"count": count, "mean": mean, "total": sum_, "sampled": n,
+                "fraction": f, "confidence": confidence}
+
+    def reservoir(self, size, batch_size=seed.FETCH_SIZE, pipeline=None,
+                  random_seed=None):
+        """Return a uniform random sample of at most size sampled rows."""
+        rng = random.Random(random_seed)
+        kept = []
+        seen = 0
+        for batch in self.batches(batch_size, pipeline):
+            for row in batch:
+                seen += 1
+                if len(kept) < size:
+                    kept.append(row)
+                else:
+                    j = rng.randrange(seen)
+                    if j < size:
+                        kept[j] = row
+        return kept
@@ -1,82 +1,783 @@
 #!/usr/bin/python3
-import mysql.connector
+import argparse
+import backends
+import collections
 import csv
+import hashlib
+import io
+import mmap
+import os
+import random
+import threading
+import time
 import uuid
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+BATCH_SIZE = 1000
+FETCH_SIZE = 1000
+USER_COLUMNS = ("user_id", "name", "email", "age")
+FINGERPRINT_BLOCK = 64 * 1024
+LOOKUP_CHUNK = 500
+
+POOL_SIZE = 8
+POOL_TIMEOUT = 30
+POOL_PING_AFTER = 5
+
+_backend = None
+_compact = None
+
+
+class PoolError(Exception):
+    """No pooled connection became available in time."""
+
+
+def backend():
+    """Return the active storage backend (see backends.from_env)."""
+    global _backend
+    if _backend is None:
+        _backend = backends.from_env()
+    return _backend
+
+
+def use_backend(name, **options):
+    """Switch to another backend, e.g. use_backend("sqlite", path="x.db")."""
+    global _backend, _compact, _pool
+    _backend = backends.BACKENDS[name](**options)
+    _compact = None
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+    return _backend
 
 
 def connect_db():
 
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",       
-            password="root"    
-        )
+        connection = backend().connect_server()
         return connection
-    except mysql.connector.Error as e:
+    except backend().errors as e:
         print(f"Error: {e}")
         return None
 
 
 def create_database(connection):
     """Create ALX_prodev DB if not exists."""
-    cursor = connection.cursor()
-    cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
-    cursor.close()
+    backend().create_database(connection)
+
+
+class PooledConnection:
+    """Connection checked out of a ConnectionPool; close() returns it."""
+
+    def __init__(self, pool, connection):
+        self._connection = connection
+        # Backstop for callers that drop the connection without close().
+        self._release = weakref.finalize(self, pool.release, connection)
+        self._release.atexit = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Hand the connection back to the pool."""
+        self._connection = None
+        self._release()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections made by a backend.
+    Connections are opened lazily up to size. get_connection waits at most
+    timeout seconds for a free slot, and connections that sat idle for
+    longer than ping_after seconds are pinged before being handed out.
+    """
+
+    def __init__(self, db_backend, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 ping_after=POOL_PING_AFTER):
+        self.backend = db_backend
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+
+    def get_connection(self, timeout=None):
+        """Check a live connection out of the pool."""
+        timeout = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(
+                f"No connection available within {timeout}s "
+                f"(pool size {self.size})"
+            )
+        try:
+            return PooledConnection(self, self._checkout())
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, returned_at = self._idle.pop()
+            idle_for = time.monotonic() - returned_at
+            if idle_for < self.ping_after or self._is_alive(connection):
+                return connection
+            self._discard(connection)
+        return self.backend.connect()
+
+    def _is_alive(self, connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except self.backend.errors:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except self.backend.errors:
+            pass
+
+    def release(self, connection):
+        """Return a connection, dropping it if it cannot be reused."""
+        try:
+            reusable = not connection.unread_result
+            if reusable and connection.in_transaction:
+                connection.rollback()
+        except self.backend.errors:
+            reusable = False
+        if reusable:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        else:
+            self._discard(connection)
+        self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, collections.deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+# Pools inherited through fork. They are kept referenced but never used:
+# collecting them would shut down sockets the parent is still using.
+_inherited_pools = []
+
+
+def get_pool():
+    """Return this process's ALX_prodev pool, creating it on first use."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            if _pool is not None:
+                _inherited_pools.append(_pool)
+            _pool = ConnectionPool(backend())
+            _pool_pid = os.getpid()
+        return _pool
 
 
-def connect_to_prodev():
-    """Connect directly to ALX_prodev DB."""
+def connect_to_prodev(timeout=None):
+    """
+    Connect to ALX_prodev DB through the shared pool.
+    Closing the returned connection hands it back to the pool.
+    """
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="root",
-            database="ALX_prodev"
-        )
-        return connection
-    except mysql.connector.Error as e:
+        return get_pool().get_connection(timeout)
+    except (PoolError,) + backend().errors as e:
         print(f"Error: {e}")
         return None
 
 
-def create_table(connection):
-    """Create user_data table if not exists."""
+def stream_rows(query, params=None, chunk_size=FETCH_SIZE, dictionary=True,
+                buffered=False):
+    """
+    Generator that runs query on its own connection and yields lists of at
+    most chunk_size rows. The default unbuffered cursor leaves the result
+    set on the server, so client memory stays flat however many rows the
+    query returns. Raises PoolError or a backend error when no connection
+    can be made.
+    """
+    connection = get_pool().get_connection()
+    finished = False
+    try:
+        compact = is_compact(connection)
+        cursor = connection.cursor(dictionary=dictionary, buffered=buffered)
+        cursor.execute(query, params)
+        names = cursor.column_names
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield decode_user_rows(rows, names, compact)
+        finished = True
+    finally:
+        # Closing a cursor with unread rows would drain the rest of the
+        # result set; the pool drops such a connection instead of reusing
+        # it, which lets the server discard the remaining rows.
+        if finished:
+            cursor.close()
+        connection.close()
+
+
+def fetch_rows(query, params=None, dictionary=True):
+    """
+    Run query on a pooled connection and return all of its rows.
+    Raises PoolError or a backend error when no connection can be made.
+    """
+    connection = get_pool().get_connection()
+    try:
+        compact = is_compact(connection)
+        cursor = connection.cursor(dictionary=dictionary)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        names = cursor.column_names
+        cursor.close()
+    finally:
+        connection.close()
+    return decode_user_rows(rows, names, compact)
+
+
+def is_compact(connection=None):
+    """
+    Whether user_data uses the compact schema (BINARY(16) user_id).
+    Callers already holding a pooled connection pass it in, so the answer
+    never waits for a second slot of the same pool.
+    """
+    global _compact
+    if _compact is None:
+        if connection is not None:
+            # None while the table does not exist yet; not cached then.
+            _compact = backend().user_id_is_binary(connection)
+        else:
+            connection = get_pool().get_connection()
+            try:
+                _compact = backend().user_id_is_binary(connection)
+            finally:
+                connection.close()
+    return bool(_compact)
+
+
+def encode_user_id(value, compact=None):
+    """
+    Convert a user_id string, or a hex prefix of one, to the form stored in
+    user_data. Under the compact schema that is raw bytes. compact defaults
+    to is_compact().
+    """
+    if value is None or isinstance(value, bytes):
+        return value
+    if not (is_compact() if compact is None else compact):
+        return value
+    return bytes.fromhex(value.replace("-", ""))
+
+
+def _uuid_str(raw):
+    # Same result as str(uuid.UUID(bytes=raw)) without building a UUID.
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def decode_user_rows(rows, column_names, compact=None):
+    """
+    Turn stored user_ids in rows back into UUID strings. compact defaults
+    to is_compact().
+    """
+    if not rows or "user_id" not in column_names:
+        return rows
+    if not (is_compact() if compact is None else compact):
+        return rows
+    if isinstance(rows[0], dict):
+        for row in rows:
+            row["user_id"] = _uuid_str(row["user_id"])
+        return rows
+    i = list(column_names).index("user_id")
+    return [row[:i] + (_uuid_str(row[i]),) + row[i + 1:] for row in rows]
+
+
+def user_id_ranges(partitions):
+    """
+    Split the user_id key space into `partitions` contiguous (lo, hi)
+    ranges, open-ended at both extremes (None). user_ids are random UUIDs,
+    so equal slices of the hex prefix space hold about equal row counts.
+    """
+    bounds = [f"{i * 16 ** 8 // partitions:08x}" for i in range(1, partitions)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def create_table(connection, compact=False):
+    """
+    Create user_data table if not exists. The compact schema stores
+    user_id as BINARY(16) and age as a small integer.
+    """
+    global _compact
     cursor = connection.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_data (
-            user_id VARCHAR(36) PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) NOT NULL,
-            age DECIMAL NOT NULL,
-            INDEX(user_id)
-        )
-    """)
+    if compact:
+        cursor.execute(backend().compact_user_table_sql.format(
+            table="user_data"))
+    else:
+        cursor.execute(backend().user_table_sql)
     connection.commit()
     print("Table user_data created successfully")
     cursor.close()
+    _compact = backend().user_id_is_binary(connection)
+    ensure_email_index(connection)
+    create_aggregate_tables(connection)
 
 
-def insert_data(connection, csv_file):
-    """Insert rows into user_data from CSV if not already present."""
+def migrate_to_compact(connection, keep_old=False):
+    """
+    Rebuild user_data with the compact schema and swap it in. The old
+    table is kept as user_data_old if keep_old is set.
+    """
+    global _compact
+    db_backend = backend()
+    if db_backend.user_id_is_binary(connection):
+        print("user_data already uses the compact schema")
+        return
     cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS user_data_compact")
+    cursor.execute(db_backend.compact_user_table_sql.format(
+        table="user_data_compact"))
+    cursor.close()
+    db_backend.copy_to_compact(connection, "user_data", "user_data_compact")
+    db_backend.swap_tables(connection, "user_data", "user_data_compact",
+                           "user_data_old")
+    if not keep_old:
+        cursor = connection.cursor()
+        cursor.execute("DROP TABLE user_data_old")
+        cursor.close()
+    connection.commit()
+    _compact = True
+    ensure_email_index(connection)
+    print("Migrated user_data to the compact schema")
+
+
+def ensure_email_index(connection):
+    """Add the unique email index to tables created before it existed."""
+    backend().ensure_unique_index(connection, "user_data", "email")
+
+
+def write_user_batch(cursor, batch, compact=None):
+    """
+    Upsert one batch of (user_id, name, email, age) tuples without
+    committing. Rows whose email already exists are left untouched.
+    Returns the number of rows inserted. compact defaults to is_compact().
+    """
+    if is_compact() if compact is None else compact:
+        batch = [(encode_user_id(row[0], True),) + tuple(row[1:])
+                 for row in batch]
+    cursor.executemany(
+        backend().upsert_sql("user_data", USER_COLUMNS, "email"), batch)
+    return _count_inserted(cursor, [row[0] for row in batch])
+
+
+def _count_inserted(cursor, user_ids):
+    """
+    Add the rows of this batch that were actually inserted to the age
+    aggregates. The user_ids are freshly generated, so a row carrying one
+    of them exists only if this batch wrote it. Returns their number.
+    """
+    histogram = collections.Counter()
+    for start in range(0, len(user_ids), LOOKUP_CHUNK):
+        ids = user_ids[start:start + LOOKUP_CHUNK]
+        cursor.execute(
+            "SELECT age FROM user_data WHERE user_id IN "
+            f"({', '.join(['%s'] * len(ids))})", ids)
+        histogram.update(int(age) for (age,) in cursor.fetchall())
+    add_to_aggregates(cursor, histogram)
+    return sum(histogram.values())
+
+
+def insert_rows(connection, rows, batch_size=BATCH_SIZE):
+    """
+    Bulk insert (user_id, name, email, age) tuples in multi-row batches,
+    committing after each batch. Loading the same data twice is a no-op.
+    Returns (rows processed, rows inserted).
+    """
+    compact = is_compact(connection)
+    cursor = connection.cursor()
+    rows = iter(rows)
+    total = inserted = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        inserted += write_user_batch(cursor, batch, compact)
+        connection.commit()
+        total += len(batch)
+    cursor.close()
+    return total, inserted
 
-    with open(csv_file, newline='') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            user_id = str(uuid.uuid4())
-            name = row['name']
-            email = row['email']
-            age = int(row['age'])
-
-            cursor.execute("""
-                SELECT COUNT(*) FROM user_data WHERE email = %s
-            """, (email,))
-            if cursor.fetchone()[0] == 0:
-                cursor.execute("""
-                    INSERT INTO user_data (user_id, name, email, age)
-                    VALUES (%s, %s, %s, %s)
-                """, (user_id, name, email, age))
 
+def create_aggregate_tables(connection):
+    """
+    Create the age aggregate tables. If they are new, fill them from the
+    rows already in user_data.
+    """
+    cursor = connection.cursor()
+    for statement in backend().aggregate_tables_sql:
+        cursor.execute(statement)
+    cursor.execute("SELECT COUNT(*) FROM user_age_summary")
+    empty = cursor.fetchone()[0] == 0
+    cursor.close()
     connection.commit()
+    if empty:
+        rebuild_aggregates(connection)
+
+
+def add_to_aggregates(cursor, histogram):
+    """Add an {age: users} histogram to the aggregate tables."""
+    histogram = {age: users for age, users in histogram.items() if users}
+    if not histogram:
+        return
+    db_backend = backend()
+    cursor.execute(
+        db_backend.upsert_sql(
+            "user_age_summary", ("id", "users", "age_sum", "age_sum_sq"),
+            "id", {"users": "users + {users}",
+                   "age_sum": "age_sum + {age_sum}",
+                   "age_sum_sq": "age_sum_sq + {age_sum_sq}"}),
+        (1, sum(histogram.values()),
+         sum(age * n for age, n in histogram.items()),
+         sum(age * age * n for age, n in histogram.items())))
+    cursor.executemany(
+        db_backend.upsert_sql("user_age_histogram", ("age", "users"), "age",
+                              {"users": "users + {users}"}),
+        sorted(histogram.items()))
+
+
+def age_summary(connection):
+    """
+    Answer count, mean, variance and the age histogram from the aggregate
+    tables, without scanning user_data.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT users, age_sum, age_sum_sq "
+                   "FROM user_age_summary WHERE id = 1")
+    users, age_sum, age_sum_sq = cursor.fetchone() or (0, 0, 0)
+    cursor.execute("SELECT age, users FROM user_age_histogram "
+                   "WHERE users > 0 ORDER BY age")
+    histogram = {int(age): int(n) for age, n in cursor.fetchall()}
+    cursor.close()
+    users = int(users)
+    if not users:
+        return {"count": 0, "histogram": histogram}
+    mean = int(age_sum) / users
+    return {"count": users, "mean": mean,
+            "variance": int(age_sum_sq) / users - mean * mean,
+            "histogram": histogram}
+
+
+def rebuild_aggregates(connection, check_only=False):
+    """
+    Recompute the age aggregates from user_data and diff them against the
+    stored ones. Unless check_only is set the stored aggregates are
+    replaced. Returns a list of (what, stored, actual) differences.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT age, COUNT(*) FROM user_data GROUP BY age")
+    actual = {int(age): int(n) for age, n in cursor.fetchall()}
+    cursor.close()
+    stored = age_summary(connection)
+
+    differences = [(f"age {age}", stored["histogram"].get(age, 0),
+                    actual.get(age, 0))
+                   for age in sorted(set(actual) | set(stored["histogram"]))
+                   if stored["histogram"].get(age, 0) != actual.get(age, 0)]
+    if stored["count"] != sum(actual.values()):
+        differences.append(("count", stored["count"], sum(actual.values())))
+
+    if not check_only:
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM user_age_summary")
+        cursor.execute("DELETE FROM user_age_histogram")
+        add_to_aggregates(cursor, actual)
+        cursor.close()
+        connection.commit()
+    return differences
+
+
+def generate_users(count, start=0):
+    """
+    Yield count synthetic (user_id, name, email, age) rows. Rows are
+    deterministic for a given start, and emails are unique across starts.
+    """
+    rng = random.Random(start)
+    for i in range(start, start + count):
+        yield (str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+               f"User {i}", f"user{i}@example.com", rng.randint(18, 100))
+
+
+def populate(connection, rows, batch_size=BATCH_SIZE):
+    """
+    Top up user_data with synthetic users until it holds `rows` rows.
+    Returns the number of rows inserted.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    cursor.close()
+    if existing >= rows:
+        return 0
+    _, inserted = insert_rows(
+        connection, generate_users(rows - existing, existing), batch_size)
+    return inserted
+
+
+def read_csv_rows(csv_file):
+    """Yield (user_id, name, email, age) tuples parsed from a CSV file."""
+    with open(csv_file, newline='') as file:
+        for row in csv.DictReader(file):
+            yield (str(uuid.uuid4()), row['name'], row['email'],
+                   int(row['age']))
+
+
+def _parse_rows(fields, lines):
+    return [(str(uuid.uuid4()), row['name'], row['email'], int(row['age']))
+            for row in csv.DictReader(lines, fieldnames=fields)]
+
+
+def file_fingerprint(csv_file, offset):
+    """
+    Checksum identifying the first `offset` bytes of a file: its length
+    plus the first and last FINGERPRINT_BLOCK bytes of that prefix. This
+    spots rewrites and truncation without rereading the whole prefix.
+    """
+    digest = hashlib.sha256(str(offset).encode())
+    with open(csv_file, 'rb') as file:
+        digest.update(file.read(min(offset, FINGERPRINT_BLOCK)))
+        tail = max(offset - FINGERPRINT_BLOCK, 0)
+        file.seek(tail)
+        digest.update(file.read(offset - tail))
+    return digest.hexdigest()
+
+
+def read_checkpoint(connection, source):
+    """Return (byte_offset, fingerprint) stored for source, or None."""
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT byte_offset, fingerprint FROM ingest_checkpoint "
+        "WHERE source = %s", (source,))
+    row = cursor.fetchone()
     cursor.close()
+    return row
+
+
+def read_csv_tail(csv_file, offset, batch_size=BATCH_SIZE):
+    """
+    Yield (rows, end_offset) batches parsed from the CSV from byte offset
+    onwards (or just past the header). An unterminated last line may still
+    be being appended, so it is left for the next run.
+    """
+    with open(csv_file, 'rb') as file:
+        header = file.readline()
+        fields = next(csv.reader([header.decode()]))
+        offset = max(offset, len(header))
+        file.seek(offset)
+        lines = []
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            lines.append(line.decode())
+            if len(lines) == batch_size:
+                yield _parse_rows(fields, lines), offset
+                lines = []
+        if lines:
+            yield _parse_rows(fields, lines), offset
+
+
+def ingest_incremental(connection, csv_file, batch_size=BATCH_SIZE):
+    """
+    Load only the part of csv_file appended since the last run.
+    A checkpoint (byte offset and fingerprint of the ingested prefix) is
+    committed together with each batch. If the ingested prefix no longer
+    matches its fingerprint the whole file is ingested again.
+    Returns (rows processed, rows inserted).
+    """
+    compact = is_compact(connection)
+    cursor = connection.cursor()
+    cursor.execute(backend().checkpoint_table_sql)
+    source = os.path.abspath(csv_file)
+    checkpoint = read_checkpoint(connection, source)
+    start = 0
+    if checkpoint is not None:
+        offset, fingerprint = checkpoint
+        if (offset <= os.path.getsize(csv_file)
+                and file_fingerprint(csv_file, offset) == fingerprint):
+            start = offset
+        else:
+            print(f"{csv_file} changed since last run, re-ingesting it")
+
+    save = backend().upsert_sql(
+        "ingest_checkpoint", ("source", "byte_offset", "fingerprint"),
+        "source", {"byte_offset": "{byte_offset}",
+                   "fingerprint": "{fingerprint}"})
+    total = inserted = 0
+    for batch, offset in read_csv_tail(csv_file, start, batch_size):
+        inserted += write_user_batch(cursor, batch, compact)
+        cursor.execute(save, (source, offset,
+                              file_fingerprint(csv_file, offset)))
+        connection.commit()
+        total += len(batch)
+    cursor.close()
+    return total, inserted
+
+
+def csv_chunks(csv_file, chunks):
+    """
+    Split csv_file (minus its header) into about `chunks` (start, end) byte
+    ranges, each ending on a line boundary.
+    """
+    with open(csv_file, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = data.find(b"\n") + 1 or len(data)
+            size = len(data) - start
+            bounds = [start]
+            for i in range(1, chunks):
+                cut = data.find(b"\n", start + size * i // chunks) + 1
+                if cut and cut > bounds[-1]:
+                    bounds.append(cut)
+            bounds.append(len(data))
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only stream over bytes [start, end) of an open binary file."""
+
+    def __init__(self, file, start, end):
+        file.seek(start)
+        self._file = file
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        read = self._file.readinto(memoryview(buffer)[:self._left])
+        self._left -= read
+        return read
+
+
+def read_csv_range(csv_file, start, end):
+    """
+    Yield (user_id, name, email, age) tuples parsed lazily from bytes
+    [start, end) of csv_file, using the header on the file's first line.
+    """
+    with open(csv_file, 'rb') as file:
+        fields = next(csv.reader([file.readline().decode()]))
+        text = io.TextIOWrapper(io.BufferedReader(
+            _ByteRange(file, start, end)), encoding='utf-8', newline='')
+        for row in csv.DictReader(text, fieldnames=fields):
+            yield (str(uuid.uuid4()), row['name'], row['email'],
+                   int(row['age']))
+
+
+def _load_chunk(csv_file, start, end, batch_size):
+    """
+    Worker: parse one byte range of csv_file and insert it.
+    Returns (rows processed, rows inserted).
+    """
+    connection = get_pool().get_connection()
+    try:
+        return insert_rows(connection, read_csv_range(csv_file, start, end),
+                           batch_size)
+    finally:
+        connection.close()
+
+
+def parallel_insert_data(csv_file, workers=None, batch_size=BATCH_SIZE):
+    """
+    Load csv_file with one worker process per chunk of the file. The file
+    is memory-mapped and cut at line boundaries; each worker streams its
+    chunk and inserts it over its own connection. Duplicate emails across
+    chunks are resolved by the unique email index. Returns the number of
+    rows inserted.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    chunks = csv_chunks(csv_file, workers)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_load_chunk, csv_file, lo, hi, batch_size)
+                   for lo, hi in chunks]
+        results = [future.result() for future in futures]
+    total = sum(rows for rows, _ in results)
+    inserted = sum(added for _, added in results)
+    _report_load(total, inserted, time.perf_counter() - start,
+                 f" with {len(chunks)} workers")
+    return inserted
+
+
+def _report_load(total, inserted, elapsed, how=""):
+    """Print how many rows a load inserted and skipped, and its rate."""
+    rate = inserted / elapsed if elapsed else 0
+    print(f"Inserted {inserted} of {total} rows ({total - inserted} "
+          f"skipped as duplicates){how} in {elapsed:.2f}s "
+          f"({rate:.0f} rows/s)")
+
+
+def insert_data(connection, csv_file, batch_size=BATCH_SIZE,
+                incremental=False, workers=None):
+    """
+    Insert rows into user_data from CSV if not already present.
+    With incremental set, only rows appended since the last incremental
+    run are parsed and loaded. With workers set, the file is split and
+    loaded by that many processes (see parallel_insert_data); each worker
+    opens its own connection, so `connection` is unused, and incremental
+    is not supported. Returns the number of rows inserted; rows whose
+    email already exists are skipped.
+    """
+    if workers:
+        if incremental:
+            raise ValueError("incremental loads cannot use workers")
+        return parallel_insert_data(csv_file, workers, batch_size)
+    start = time.perf_counter()
+    if incremental:
+        total, inserted = ingest_incremental(connection, csv_file,
+                                             batch_size)
+    else:
+        total, inserted = insert_rows(connection, read_csv_rows(csv_file),
+                                      batch_size)
+    _report_load(total, inserted, time.perf_counter() - start)
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintain the ALX_prodev aggregate tables.")
+    parser.add_argument("command", choices=("verify-aggregates",
+                                            "rebuild-aggregates"))
+    args = parser.parse_args()
+
+    connection = connect_to_prodev()
+    differences = rebuild_aggregates(
+        connection, check_only=args.command == "verify-aggregates")
+    connection.close()
+    for what, stored, actual in differences:
+        print(f"{what}: stored {stored}, actual {actual}")
+    if args.command == "verify-aggregates":
+        print("Aggregates are consistent" if not differences
+              else f"{len(differences)} aggregate mismatches")
+        raise SystemExit(1 if differences else 0)
+    print("Aggregates rebuilt")
+
+
+if __name__ == "__main__":
+    main()
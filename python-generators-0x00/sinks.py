@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+"""Buffered NDJSON/CSV export sinks for the user_data generators."""
+import argparse
+import csv
+import decimal
+import io
+import json
+import os
+import sys
+import time
+import zlib
+
+FORMATS = ("ndjson", "csv")
+COMPRESSIONS = (None, "gzip", "zstd")
+BUFFER_SIZE = 1 << 20
+
+
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() \
+            else float(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class Sink:
+    """
+    Writes batches of rows (dicts or tuples) to a file or stdout.
+    Each batch is encoded into one buffer and written with a single call,
+    optionally through gzip or zstd compression. sync() ends the current
+    compressed frame and flushes to disk, so the file is valid up to the
+    offset it returns; concatenated gzip members and zstd frames decode as
+    one stream.
+    """
+
+    def __init__(self, path=None, format="ndjson", compression=None,
+                 columns=None, append=False):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format: {format!r}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression!r}")
+        self.path = path
+        self.format = format
+        self.compression = compression
+        self.columns = list(columns) if columns else None
+        if path is None or path == "-":
+            self._file = sys.stdout.buffer
+            self._header_pending = format == "csv"
+        else:
+            self._file = open(path, "ab" if append else "wb",
+                              buffering=BUFFER_SIZE)
+            self._header_pending = format == "csv" and self._file.tell() == 0
+        self._compressor = None
+        self.rows = 0
+        self.bytes_written = 0
+        self._started = time.perf_counter()
+
+    def _new_compressor(self):
+        if self.compression == "gzip":
+            return zlib.compressobj(6, zlib.DEFLATED, 31)
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression needs the zstandard "
+                              "package (pip install zstandard)") from e
+        return zstandard.ZstdCompressor().compressobj()
+
+    def _encode(self, rows):
+        if self.format == "ndjson":
+            if self.columns and not isinstance(rows[0], dict):
+                rows = [dict(zip(self.columns, row)) for row in rows]
+            return "".join(json.dumps(row, default=_json_default,
+                                      separators=(",", ":")) + "\n"
+                           for row in rows)
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if isinstance(rows[0], dict):
+            self.columns = self.columns or list(rows[0])
+            rows = [[row[column] for column in self.columns] for row in rows]
+        if self._header_pending and self.columns:
+            writer.writerow(self.columns)
+        self._header_pending = False
+        writer.writerows(rows)
+        return out.getvalue()
+
+    def _write(self, data):
+        if self.compression:
+            if self._compressor is None:
+                self._compressor = self._new_compressor()
+            data = self._compressor.compress(data)
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def write_batch(self, rows):
+        """Encode and write one batch of rows."""
+        if not rows:
+            return
+        self._write(self._encode(rows).encode())
+        self.rows += len(rows)
+
+    def sync(self):
+        """
+        Close the current compressed frame, flush and fsync. Returns the
+        byte offset up to which the output is complete.
+        """
+        if self._compressor is not None:
+            tail = self._compressor.flush()
+            self._file.write(tail)
+            self.bytes_written += len(tail)
+            self._compressor = None
+        self._file.flush()
+        if self._file is not sys.stdout.buffer:
+            os.fsync(self._file.fileno())
+            return self._file.tell()
+        return None
+
+    def close(self):
+        """Finish the output and report throughput on stderr."""
+        self.sync()
+        if self._file is not sys.stdout.buffer:
+            self._file.close()
+        print(self.report(), file=sys.stderr)
+
+    def report(self):
+        elapsed = time.perf_counter() - self._started
+        rate = self.rows / elapsed if elapsed else 0
+        return (f"Wrote {self.rows} rows, "
+                f"{self.bytes_written / 2 ** 20:.1f} MiB in {elapsed:.2f}s "
+                f"({rate:.0f} rows/s)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_sink(path=None, format=None, compression=None, **kwargs):
+    """
+    Open a Sink, inferring format and compression from the file name when
+    not given (e.g. users.csv.gz, users.ndjson.zst).
+    """
+    name = path or ""
+    if compression is None:
+        if name.endswith(".gz"):
+            compression = "gzip"
+        elif name.endswith(".zst"):
+            compression = "zstd"
+    if format is None:
+        format = "csv" if ".csv" in os.path.basename(name) else "ndjson"
+    return Sink(path, format, compression, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump user_data.")
+    parser.add_argument("path", nargs="?", default="-",
+                        help="output file, - for stdout")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--compression", choices=("gzip", "zstd"))
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--min-age", type=int,
+                        help="only export users older than this")
+    args = parser.parse_args()
+
+    from pipeline import Pipeline
+
+    users = Pipeline()
+    if args.min_age is not None:
+        users = users.filter("age", ">", args.min_age)
+    with open_sink(args.path, args.format, args.compression) as sink:
+        for batch in users.batches(args.batch_size):
+            sink.write_batch(batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/python3
+"""Memory-mapped columnar snapshots of user_data."""
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import seed
+from columnar import NUMERIC_COLUMNS, ColumnBatch
+from pipeline import Pipeline
+
+DEFAULT_PATH = "user_data.snapshot"
+MAX_AGE = 3600
+ID_DTYPE = "S36"
+STRING_COLUMNS = ("name", "email")
+KEEP_VERSIONS = 2
+
+
+def snapshot_path():
+    """Snapshot directory: ALX_SNAPSHOT_DIR or user_data.snapshot."""
+    return os.environ.get("ALX_SNAPSHOT_DIR", DEFAULT_PATH)
+
+
+class StringColumn:
+    """Strings stored as one UTF-8 arena plus int64 row offsets."""
+
+    def __init__(self, arena, offsets):
+        self._arena = arena
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def slice(self, lo, hi):
+        """Decode rows lo to hi into a list of str."""
+        offsets = self._offsets[lo:hi + 1]
+        if len(offsets) < 2:
+            return []
+        raw = self._arena[offsets[0]:offsets[-1]].tobytes()
+        bounds = (offsets - offsets[0]).tolist()
+        return [raw[a:b].decode() for a, b in zip(bounds, bounds[1:])]
+
+    def __getitem__(self, index):
+        return self.slice(index, index + 1)[0]
+
+
+def _map(path, dtype, rows):
+    # np.memmap refuses empty files.
+    if rows == 0:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype, "r", shape=(rows,))
+
+
+class Snapshot:
+    """
+    The current version of a snapshot directory. Columns are memory-mapped
+    read-only, so numeric batches are views into the page cache rather than
+    copies. A refresh publishes a new version; an open Snapshot keeps
+    reading the version it was opened on.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or snapshot_path()
+        with open(os.path.join(self.path, "CURRENT")) as f:
+            self.directory = os.path.join(self.path, f.read().strip())
+        with open(os.path.join(self.directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self.watermark = self.meta["watermark"]
+
+    def age(self):
+        """Seconds since the data was read from the database."""
+        return time.time() - self.meta["refreshed"]
+
+    def column(self, name):
+        """A memory-mapped numeric array, or a StringColumn for text."""
+        if name not in self.meta["columns"]:
+            raise KeyError(f"Column not in snapshot: {name!r}")
+        dtype = self.meta["columns"][name]
+        base = os.path.join(self.directory, name)
+        if dtype == "string":
+            return StringColumn(_map(f"{base}.arena", np.uint8,
+                                     os.path.getsize(f"{base}.arena")),
+                                _map(f"{base}.offsets", np.int64,
+                                     self.rows + 1))
+        return _map(f"{base}.bin", dtype, self.rows)
+
+    def batches(self, batch_size=seed.FETCH_SIZE, columns=seed.USER_COLUMNS):
+        """Generator that yields the snapshot as ColumnBatch objects."""
+        data = {name: self.column(name) for name in columns}
+        for lo in range(0, self.rows, batch_size):
+            hi = min(lo + batch_size, self.rows)
+            batch = {}
+            for name, values in data.items():
+                if isinstance(values, StringColumn):
+                    batch[name] = values.slice(lo, hi)
+                elif values.dtype.kind == "S":
+                    batch[name] = [v.decode() for v in values[lo:hi].tolist()]
+                else:
+                    batch[name] = values[lo:hi]
+            yield ColumnBatch(batch, hi - lo)
+
+
+def current(max_age=None):
+    """
+    The snapshot in ALX_SNAPSHOT_DIR if that is set, the snapshot exists
+    and it was refreshed within max_age seconds (default
+    ALX_SNAPSHOT_MAX_AGE, else 3600). Otherwise None, and callers read the
+    database.
+    """
+    path = os.environ.get("ALX_SNAPSHOT_DIR")
+    if path is None:
+        return None
+    if max_age is None:
+        max_age = float(os.environ.get("ALX_SNAPSHOT_MAX_AGE", MAX_AGE))
+    try:
+        snapshot = Snapshot(path)
+    except FileNotFoundError:
+        return None
+    return snapshot if snapshot.age() <= max_age else None
+
+
+class _Writer:
+    """Appends batches of row dicts to the column files of a version."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.rows = 0
+        self.watermark = None
+        self._files = {}
+        self._ends = {}
+        for name in STRING_COLUMNS:
+            arena = os.path.join(directory, f"{name}.arena")
+            self._ends[name] = os.path.getsize(arena) \
+                if os.path.exists(arena) else 0
+            if not os.path.exists(arena):
+                with open(os.path.join(directory, f"{name}.offsets"),
+                          "wb") as f:
+                    f.write(np.zeros(1, np.int64).tobytes())
+
+    def _file(self, name):
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self.directory, name), "ab")
+        return self._files[name]
+
+    def write(self, rows):
+        if not rows:
+            return
+        ids = [row["user_id"] for row in rows]
+        self._file("user_id.bin").write(np.array(ids, ID_DTYPE).tobytes())
+        for name, dtype in NUMERIC_COLUMNS.items():
+            self._file(f"{name}.bin").write(np.fromiter(
+                (row[name] for row in rows), dtype, count=len(rows)).tobytes())
+        for name in STRING_COLUMNS:
+            encoded = [row[name].encode() for row in rows]
+            ends = self._ends[name] + np.cumsum(
+                np.fromiter(map(len, encoded), np.int64, count=len(rows)))
+            self._file(f"{name}.arena").write(b"".join(encoded))
+            self._file(f"{name}.offsets").write(ends.tobytes())
+            self._ends[name] = int(ends[-1])
+        top = max(ids)
+        if self.watermark is None or top > self.watermark:
+            self.watermark = top
+        self.rows += len(rows)
+
+    def close(self):
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+
+def _new_version(path):
+    os.makedirs(path, exist_ok=True)
+    directory = os.path.join(path, f"v{time.time_ns()}")
+    os.mkdir(directory)
+    return directory
+
+
+def _publish(path, directory, meta):
+    """Write meta.json, switch CURRENT to directory and prune old versions."""
+    meta["columns"] = {"user_id": ID_DTYPE, "name": "string",
+                       "email": "string",
+                       **{name: np.dtype(dtype).str
+                          for name, dtype in NUMERIC_COLUMNS.items()}}
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    pointer = os.path.join(path, "CURRENT.tmp")
+    with open(pointer, "w") as f:
+        f.write(os.path.basename(directory))
+    os.replace(pointer, os.path.join(path, "CURRENT"))
+    versions = sorted(name for name in os.listdir(path)
+                      if name.startswith("v"))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def _touch(snapshot, refreshed):
+    """Record that the snapshot's version was checked at `refreshed`."""
+    meta = dict(snapshot.meta, refreshed=refreshed)
+    tmp = os.path.join(snapshot.directory, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(snapshot.directory, "meta.json"))
+
+
+def create(path=None, batch_size=seed.FETCH_SIZE):
+    """Dump user_data into a new snapshot version. Returns its row count."""
+    path = path or snapshot_path()
+    started = time.time()
+    directory = _new_version(path)
+    writer = _Writer(directory)
+    for rows in seed.stream_rows(
+            f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data",
+            chunk_size=batch_size):
+        writer.write(rows)
+    writer.close()
+    _publish(path, directory, {"rows": writer.rows,
+                               "watermark": writer.watermark,
+                               "created": started, "refreshed": started})
+    return writer.rows
+
+
+def _missing_ids(snapshot, batch_size):
+    """
+    Diff the table's user_ids against the snapshot. Returns the ids only
+    in the table and the number of snapshot rows still in the table.
+    """
+    known = np.sort(snapshot.column("user_id"))
+    missing = []
+    matched = 0
+    for rows in seed.stream_rows("SELECT user_id FROM user_data",
+                                 chunk_size=batch_size, dictionary=False):
+        ids = np.array([user_id for (user_id,) in rows], ID_DTYPE)
+        if len(known):
+            at = np.minimum(np.searchsorted(known, ids), len(known) - 1)
+            found = known[at] == ids
+        else:
+            found = np.zeros(len(ids), bool)
+        matched += int(found.sum())
+        missing.extend(v.decode() for v in ids[~found].tolist())
+    return missing, matched
+
+
+def refresh(path=None, batch_size=seed.FETCH_SIZE):
+    """
+    Bring the snapshot up to date and return (method, rows added).
+    The table's user_ids are always diffed against the snapshot first,
+    since row counts alone cannot tell a deletion plus an insertion from
+    no change. Deleted rows, or no snapshot yet, mean a full rebuild
+    ("create"). If every new row sorts above the user_id watermark they
+    are read with one range scan ("watermark"); otherwise the missing
+    rows are looked up by user_id ("diff"). With no new rows only the
+    refresh time of the current version is updated ("unchanged"). Updates
+    to existing rows are not detected; run create() after them.
+    """
+    path = path or snapshot_path()
+    try:
+        old = Snapshot(path)
+    except FileNotFoundError:
+        return "create", create(path, batch_size)
+    started = time.time()
+    missing, matched = _missing_ids(old, batch_size)
+    if matched < old.rows:
+        return "create", create(path, batch_size)
+    if not missing:
+        _touch(old, started)
+        return "unchanged", 0
+
+    if old.watermark is None or min(missing) > old.watermark:
+        method = "watermark"
+        users = Pipeline()
+        if old.watermark is not None:
+            users = users.filter("user_id", ">", old.watermark)
+        batches = users.batches(batch_size)
+    else:
+        method = "diff"
+        batches = (rows for i in range(0, len(missing), seed.LOOKUP_CHUNK)
+                   for rows in Pipeline().filter(
+                       "user_id", "in", missing[i:i + seed.LOOKUP_CHUNK]
+                   ).batches(batch_size))
+
+    directory = _new_version(path)
+    for name in os.listdir(old.directory):
+        if name != "meta.json":
+            shutil.copyfile(os.path.join(old.directory, name),
+                            os.path.join(directory, name))
+    writer = _Writer(directory)
+    for rows in batches:
+        writer.write(rows)
+    writer.close()
+    watermark = max(filter(None, (old.watermark, writer.watermark)),
+                    default=None)
+    _publish(path, directory, {"rows": old.rows + writer.rows,
+                               "watermark": watermark,
+                               "created": old.meta["created"],
+                               "refreshed": started})
+    return method, writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage the columnar snapshot of user_data.")
+    parser.add_argument("command", choices=("create", "refresh", "info"))
+    parser.add_argument("--path", default=None,
+                        help="snapshot directory (default ALX_SNAPSHOT_DIR "
+                             f"or {DEFAULT_PATH})")
+    parser.add_argument("--batch-size", type=int, default=seed.FETCH_SIZE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "create":
+        rows = create(args.path, args.batch_size)
+        print(f"Snapshot of {rows} rows created "
+              f"in {time.perf_counter() - started:.2f}s")
+    elif args.command == "refresh":
+        method, rows = refresh(args.path, args.batch_size)
+        if method == "unchanged":
+            print(f"Snapshot already up to date "
+                  f"(checked in {time.perf_counter() - started:.2f}s)")
+        else:
+            print(f"Snapshot refreshed by {method}: {rows} rows added "
+                  f"in {time.perf_counter() - started:.2f}s")
+    else:
+        snapshot = Snapshot(args.path)
+        print(f"{snapshot.directory}: {snapshot.rows} rows, "
+              f"watermark {snapshot.watermark}, "
+              f"refreshed {snapshot.age():.0f}s ago")
+
+
+if __name__ == "__main__":
+    main()
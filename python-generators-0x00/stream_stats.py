@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+"""Mergeable streaming statistics over batches of numbers."""
+import numpy as np
+
+
+class TDigest:
+    """
+    Approximate quantile sketch (merging t-digest).
+    Values are buffered and periodically compressed into at most about
+    `compression` weighted centroids, which are kept small near the tails
+    so extreme quantiles stay accurate.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._pending = []
+
+    def update(self, values, weights=None):
+        """Add a batch of values (optionally pre-weighted)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return
+        if weights is None:
+            weights = np.ones(values.size)
+        self._pending.append((values, np.asarray(weights, dtype=np.float64)))
+        if sum(v.size for v, _ in self._pending) > 10 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another digest into this one."""
+        other._compress()
+        self.update(other._means, other._weights)
+
+    def _compress(self):
+        if not self._pending:
+            return
+        means = np.concatenate([self._means] + [v for v, _ in self._pending])
+        weights = np.concatenate(
+            [self._weights] + [w for _, w in self._pending])
+        self._pending = []
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        # k1 scale function: one unit of k per centroid.
+        k = self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5)
+        _, cluster = np.unique(np.floor(k), return_inverse=True)
+        self._weights = np.bincount(cluster, weights)
+        self._means = np.bincount(cluster, weights * means) / self._weights
+
+    def quantile(self, q, lo, hi):
+        """Estimate quantile(s) q, given the exact min lo and max hi."""
+        self._compress()
+        if not self._weights.size:
+            return np.nan
+        centres = np.cumsum(self._weights) - self._weights / 2
+        total = self._weights.sum()
+        return np.interp(np.asarray(q) * total,
+                         np.concatenate(([0], centres, [total])),
+                         np.concatenate(([lo], self._means, [hi])))
+
+
+class StreamStats:
+    """
+    Count, mean, variance, min/max, histogram and approximate quantiles
+    accumulated batch by batch in bounded memory. Partial results from
+    separate scans can be combined with merge(). Values outside
+    value_range are counted everywhere except the histogram.
+    """
+
+    def __init__(self, bins=24, value_range=(0, 120), compression=100):
+        self.edges = np.histogram_bin_edges([], bins=bins, range=value_range)
+        self.histogram = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.digest = TDigest(compression)
+
+    def update(self, values):
+        """Add one batch of values."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return self
+        batch_mean = values.mean()
+        batch_m2 = np.square(values - batch_mean).sum()
+        self._combine(values.size, batch_mean, batch_m2)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.histogram += np.histogram(values, bins=self.edges)[0]
+        self.digest.update(values)
+        return self
+
+    def merge(self, other):
+        """Fold the statistics of another StreamStats into this one."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge stats with different histograms")
+        if other.count:
+            self._combine(other.count, other.mean, other._m2)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.histogram += other.histogram
+            self.digest.merge(other.digest)
+        return self
+
+    def _combine(self, count, mean, m2):
+        # Chan et al. pairwise update of count, mean and sum of squares.
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else np.nan
+
+    def quantile(self, q):
+        """Approximate quantile(s) q in [0, 1]."""
+        return self.digest.quantile(q, self.min, self.max)
+
+    def summary(self, quantiles=(0.25, 0.5, 0.75, 0.9, 0.99)):
+        """Return the statistics as a plain dict."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": float(self.mean),
+            "variance": float(self.variance),
+            "std": float(np.sqrt(self.variance)),
+            "min": float(self.min),
+            "max": float(self.max),
+            "quantiles": dict(zip(quantiles,
+                                  self.quantile(quantiles).tolist())),
+            "histogram": list(zip(self.edges[:-1].tolist(),
+                                  self.histogram.tolist())),
+        }
+
+
+def summarize(batches, **kwargs):
+    """Build a StreamStats from an iterable of batches."""
+    stats = StreamStats(**kwargs)
+    for batch in batches:
+        stats.update(batch)
+    return stats
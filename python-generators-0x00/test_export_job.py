@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+"""
+Unit tests for export_job
+"""
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import export_job
+import seed
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+class ExportJobTestCase(unittest.TestCase):
+    """Runs export jobs against a throwaway SQLite user_data table"""
+
+    ROWS = 250
+
+    def setUp(self):
+        """Create and populate a temporary SQLite database"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(self.tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        connection = seed.connect_to_prodev()
+        seed.create_table(connection)
+        seed.populate(connection, self.ROWS)
+        connection.close()
+        self.path = os.path.join(self.tmp.name, "users.ndjson.gz")
+        patcher = patch.object(export_job, "BACKOFF_BASE", 0.001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def exported_ids(self):
+        """user_ids in the export file, in file order"""
+        with gzip.open(self.path, "rt") as f:
+            return [json.loads(line)["user_id"] for line in f]
+
+    def all_ids(self):
+        """user_ids in the table, sorted"""
+        return [row["user_id"] for row in seed.fetch_rows(
+            "SELECT user_id FROM user_data ORDER BY user_id")]
+
+
+class TestResume(ExportJobTestCase):
+    """Interrupted exports resume from their checkpoint"""
+
+    def crash_after(self, pages):
+        """Run a job that raises after writing the given number of pages"""
+        paginate = lazy_paginate.lazy_pagination
+
+        def crashing_pagination(*args, **kwargs):
+            for i, page in enumerate(paginate(*args, **kwargs)):
+                if i == pages:
+                    raise RuntimeError("killed")
+                yield page
+
+        job = export_job.ExportJob(self.path, batch_size=40,
+                                   checkpoint_interval=0)
+        with patch.object(lazy_paginate, "lazy_pagination",
+                          crashing_pagination):
+            with self.assertRaises(RuntimeError):
+                job.run()
+        return job.load_checkpoint()
+
+    def test_resume_truncates_and_continues(self):
+        """Bytes past the checkpoint are dropped and no row is repeated"""
+        state = self.crash_after(3)
+        self.assertFalse(state["complete"])
+        self.assertEqual(state["rows"], 120)
+        with open(self.path, "ab") as f:
+            f.write(b"torn write past the checkpoint")
+
+        state = export_job.ExportJob(self.path, batch_size=40).run()
+        self.assertTrue(state["complete"])
+        self.assertEqual(state["rows"], self.ROWS)
+        self.assertEqual(self.exported_ids(), self.all_ids())
+
+    def test_complete_export_is_not_rerun(self):
+        """Running a finished export again leaves the file alone"""
+        export_job.ExportJob(self.path, batch_size=40).run()
+        size = os.path.getsize(self.path)
+        with patch.object(lazy_paginate, "lazy_pagination") as paginate:
+            state = export_job.ExportJob(self.path, batch_size=40).run()
+        paginate.assert_not_called()
+        self.assertTrue(state["complete"])
+        self.assertEqual(os.path.getsize(self.path), size)
+
+    def test_short_file_is_rejected(self):
+        """A file shorter than its checkpoint offset is not resumed"""
+        self.crash_after(3)
+        with open(self.path, "r+b") as f:
+            f.truncate(10)
+        with self.assertRaises(ValueError):
+            export_job.ExportJob(self.path, batch_size=40).run()
+
+    def test_changed_options_are_rejected(self):
+        """A checkpoint is only resumed with the options that wrote it"""
+        self.crash_after(1)
+        job = export_job.ExportJob(self.path, batch_size=40, format="csv")
+        with self.assertRaises(ValueError):
+            job.run()
+
+
+class TestReconnect(ExportJobTestCase):
+    """Connection failures are retried with backoff"""
+
+    def test_connect_failures_are_retried(self):
+        """Failing to open a connection backs off instead of crashing"""
+        db_backend = seed.backend()
+        connect = db_backend.connect
+        failures = iter([True, True])
+
+        def flaky_connect():
+            if next(failures, False):
+                raise sqlite3.OperationalError("unable to open database")
+            return connect()
+
+        seed.get_pool().close_all()
+        job = export_job.ExportJob(self.path, batch_size=40)
+        with patch.object(db_backend, "connect", flaky_connect), \
+                patch("export_job.time.sleep") as sleep:
+            state = job.run()
+        self.assertEqual(sleep.call_count, 2)
+        self.assertTrue(state["complete"])
+        self.assertEqual(self.exported_ids(), self.all_ids())
+
+    def test_gives_up_after_retries(self):
+        """A connection that never comes back ends the job with the error"""
+        def broken_connect():
+            raise sqlite3.OperationalError("unable to open database")
+
+        seed.get_pool().close_all()
+        job = export_job.ExportJob(self.path, batch_size=40, retries=2)
+        with patch.object(seed.backend(), "connect", broken_connect), \
+                patch("export_job.time.sleep"):
+            with self.assertRaises(sqlite3.OperationalError):
+                job.run()
+        self.assertFalse(job.load_checkpoint()["complete"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""
+Unit tests for parallel_scan
+"""
+import os
+import queue
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import parallel_scan
+import seed
+
+
+class RacingQueue:
+    """Queue whose first get() times out just before the items arrive"""
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.timed_out = False
+
+    def get(self, timeout=None):
+        if not self.timed_out:
+            self.timed_out = True
+            raise queue.Empty
+        return self.get_nowait()
+
+    def get_nowait(self):
+        if not self.items:
+            raise queue.Empty
+        return self.items.pop(0)
+
+
+def worker(exitcode):
+    """A finished worker process that exited with exitcode"""
+    return Mock(exitcode=exitcode, pid=1, **{"is_alive.return_value": False})
+
+
+class TestDrain(unittest.TestCase):
+    """Test class for _drain"""
+
+    def setUp(self):
+        """Poll without waiting"""
+        patcher = patch.object(parallel_scan, "POLL_INTERVAL", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_sent_before_exit_are_drained(self):
+        """Workers that exit right after the timeout lose no batches"""
+        items = RacingQueue([("rows", [1]), ("done", None),
+                             ("rows", [2]), ("done", None)])
+        self.assertEqual(
+            list(parallel_scan._drain(items, 2, [worker(0), worker(0)])),
+            [[1], [2]])
+
+    def test_missing_partitions_raise(self):
+        """Workers that exited without finishing every partition fail"""
+        items = RacingQueue([("rows", [1]), ("done", None)])
+        with self.assertRaisesRegex(RuntimeError, "1 partitions"):
+            list(parallel_scan._drain(items, 2, [worker(0)]))
+
+    def test_dead_worker_raises(self):
+        """A worker killed by a signal fails the scan"""
+        with self.assertRaisesRegex(RuntimeError, "exit code -9"):
+            list(parallel_scan._drain(RacingQueue([]), 1, [worker(-9)]))
+
+
+class TestParallelBatches(unittest.TestCase):
+    """parallel_batches against a throwaway SQLite user_data table"""
+
+    def setUp(self):
+        """Create and populate a temporary SQLite database"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        with patch("builtins.print"):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            seed.populate(connection, 300)
+        connection.close()
+
+    def test_every_row_is_read_once(self):
+        """Ordered scans return rows in user_id order; others in any"""
+        expected = [row["user_id"] for row in seed.fetch_rows(
+            "SELECT user_id FROM user_data ORDER BY user_id")]
+        for ordered in (True, False):
+            with self.subTest(ordered=ordered):
+                ids = [row["user_id"]
+                       for batch in parallel_scan.parallel_batches(
+                           40, workers=3, partitions=6, ordered=ordered)
+                       for row in batch]
+                if not ordered:
+                    ids.sort()
+                self.assertEqual(ids, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
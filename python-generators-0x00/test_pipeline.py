@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+"""
+Unit tests for pipeline
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import seed
+from pipeline import Pipeline
+
+
+class TestCompile(unittest.TestCase):
+    """Which steps Pipeline.compile() pushes into SQL"""
+
+    def setUp(self):
+        """Compile against the plain (string user_id) schema"""
+        patcher = patch.object(seed, "is_compact", return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_compile(self):
+        """Leading where/project/limit steps become SQL"""
+        cases = [
+            (Pipeline(),
+             ("SELECT * FROM user_data", (), ())),
+            (Pipeline().filter("age", ">", 25).project("name", "age")
+             .limit(10),
+             ("SELECT name, age FROM user_data WHERE age > %s LIMIT 10",
+              (25,), ())),
+            (Pipeline().filter("age", "!=", 30).filter("name", "==", "a"),
+             ("SELECT * FROM user_data WHERE age <> %s AND name = %s",
+              (30, "a"), ())),
+            (Pipeline().filter("age", "in", (20, 21)),
+             ("SELECT * FROM user_data WHERE age IN (%s, %s)",
+              (20, 21), ())),
+            (Pipeline().filter("age", "in", []),
+             ("SELECT * FROM user_data WHERE age IN (NULL)", (), ())),
+            (Pipeline().limit(10).limit(3),
+             ("SELECT * FROM user_data LIMIT 3", (), ())),
+            (Pipeline().limit(5).filter("age", ">", 25),
+             ("SELECT * FROM user_data LIMIT 5", (),
+              (("where", "age", ">", 25),))),
+            (Pipeline().filter(len).filter("age", ">", 25),
+             ("SELECT * FROM user_data", (),
+              (("call", len), ("where", "age", ">", 25)))),
+            (Pipeline().project("age").map(str).limit(2),
+             ("SELECT age FROM user_data", (),
+              (("map", str), ("limit", 2)))),
+        ]
+        for pipeline, expected in cases:
+            with self.subTest(steps=pipeline.steps):
+                self.assertEqual(pipeline.compile(), expected)
+
+    def test_compact_user_ids_are_encoded(self):
+        """user_id values are converted to the stored form"""
+        user_id = "00000000-0000-4000-8000-000000000001"
+        seed.is_compact.return_value = True
+        sql, params, _ = Pipeline().filter("user_id", ">", user_id).compile()
+        self.assertEqual(sql, "SELECT * FROM user_data WHERE user_id > %s")
+        self.assertEqual(params, (bytes.fromhex(user_id.replace("-", "")),))
+
+    def test_invalid_pipelines(self):
+        """Bad columns, operators and projections are rejected"""
+        cases = [
+            lambda: Pipeline().filter("age; DROP", ">", 1),
+            lambda: Pipeline().filter("age", "like", 1),
+            lambda: Pipeline().project("age").filter("name", "=", "a")
+            .compile(),
+            lambda: Pipeline().project("age").project("name").compile(),
+        ]
+        for i, build in enumerate(cases):
+            with self.subTest(case=i):
+                with self.assertRaises(ValueError):
+                    build()
+
+
+class TestBatches(unittest.TestCase):
+    """Pipeline.batches() against a throwaway SQLite user_data table"""
+
+    def setUp(self):
+        """Create and populate a temporary SQLite database"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        with patch("builtins.print"):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            seed.populate(connection, 200)
+        connection.close()
+
+    def test_python_side_limit(self):
+        """A limit after a callable keeps the first count matching rows"""
+        pipeline = Pipeline().filter(lambda row: row["age"] > 50) \
+            .project("age").limit(7)
+        batches = list(pipeline.batches(batch_size=10))
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual(len(rows), 7)
+        self.assertTrue(all(row["age"] > 50 for row in rows))
+        self.assertEqual(list(rows[0]), ["age"])
+
+    def test_where_after_limit_runs_in_python(self):
+        """A where after a limit filters only the limited rows"""
+        first = [row["age"] for row in Pipeline().limit(20)]
+        rows = list(Pipeline().limit(20).filter("age", ">", 50))
+        self.assertEqual([row["age"] for row in rows],
+                         [age for age in first if age > 50])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,288 @@
+#!/usr/bin/python3
+"""
+Unit tests for the seed connection pool and CSV loading
+"""
+import gc
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import seed
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Pool slots are returned however a connection's user finishes"""
+
+    def setUp(self):
+        """Use a one-connection pool over a temporary SQLite database"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        with patch("builtins.print"):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            seed.populate(connection, 10)
+        connection.close()
+        seed.get_pool().close_all()
+        self.pool = seed.ConnectionPool(seed.backend(), size=1, timeout=0.1)
+        self.addCleanup(self.pool.close_all)
+        patcher = patch.object(seed, "get_pool", return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertSlotFree(self):
+        """The pool's only slot can be checked out at once"""
+        self.pool.get_connection(timeout=0).close()
+
+    def test_exhausted_pool_raises(self):
+        """get_connection raises PoolError when no slot frees up"""
+        connection = self.pool.get_connection()
+        with self.assertRaises(seed.PoolError):
+            self.pool.get_connection(timeout=0)
+        connection.close()
+        self.assertSlotFree()
+
+    def test_fetch_rows_error_releases_slot(self):
+        """A failing query still hands its connection back"""
+        for _ in range(3):
+            with self.assertRaises(sqlite3.OperationalError):
+                seed.fetch_rows("SELECT * FROM no_such_table")
+        self.assertSlotFree()
+        self.assertEqual(len(seed.fetch_rows("SELECT * FROM user_data")), 10)
+
+    def test_stream_rows_error_releases_slot(self):
+        """A stream whose query fails hands its connection back"""
+        with self.assertRaises(sqlite3.OperationalError):
+            next(seed.stream_rows("SELECT * FROM no_such_table"))
+        self.assertSlotFree()
+
+    def test_cold_schema_check_uses_held_connection(self):
+        """Streams work on a one-slot pool before the schema is known"""
+        with patch.object(seed, "_compact", None):
+            stream = seed.stream_rows("SELECT * FROM user_data")
+            self.assertEqual(len(next(stream)), 10)
+            stream.close()
+        with patch.object(seed, "_compact", None):
+            self.assertEqual(len(seed.fetch_rows("SELECT * FROM user_data")),
+                             10)
+        self.assertSlotFree()
+
+    def test_abandoned_stream_releases_slot(self):
+        """Closing a stream part way through hands its connection back"""
+        stream = seed.stream_rows("SELECT * FROM user_data", chunk_size=2)
+        self.assertEqual(len(next(stream)), 2)
+        stream.close()
+        self.assertSlotFree()
+
+    def test_connect_error_releases_slot(self):
+        """A connection that cannot be opened does not use up a slot"""
+        def broken_connect():
+            raise sqlite3.OperationalError("unable to open database")
+
+        with patch.object(seed.backend(), "connect", broken_connect):
+            for _ in range(3):
+                with self.assertRaises(sqlite3.OperationalError):
+                    self.pool.get_connection()
+        self.assertSlotFree()
+
+    def test_dropped_connection_releases_slot(self):
+        """A connection dropped without close() is returned when collected"""
+        connection = self.pool.get_connection()
+        del connection
+        gc.collect()
+        self.assertSlotFree()
+
+    def test_close_is_idempotent(self):
+        """Closing a connection twice frees exactly one slot"""
+        connection = self.pool.get_connection()
+        connection.close()
+        connection.close()
+        held = self.pool.get_connection()
+        with self.assertRaises(seed.PoolError):
+            self.pool.get_connection(timeout=0)
+        held.close()
+
+
+class TestInsertData(unittest.TestCase):
+    """insert_data reports rows inserted, not rows processed"""
+
+    def setUp(self):
+        """Create an empty table and a CSV with one duplicate email"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        self.csv = os.path.join(tmp.name, "users.csv")
+        with open(self.csv, "w") as f:
+            f.write("name,email,age\n")
+            for i in range(20):
+                f.write(f"User {i},user{i}@example.com,{20 + i}\n")
+            f.write("Again,user0@example.com,99\n")
+        with patch("builtins.print"):
+            self.connection = seed.connect_to_prodev()
+            seed.create_table(self.connection)
+        self.addCleanup(self.connection.close)
+
+    def test_duplicates_are_skipped(self):
+        """Duplicate emails are counted as skipped, not loaded"""
+        for options in ({}, {"incremental": True}):
+            with self.subTest(**options), patch("builtins.print") as out:
+                inserted = seed.insert_data(self.connection, self.csv,
+                                            batch_size=8, **options)
+                self.assertEqual(inserted, 0 if options else 20)
+                self.assertIn(f"Inserted {inserted} of 21 rows "
+                              f"({21 - inserted} skipped",
+                              out.call_args.args[0])
+        self.assertEqual(seed.fetch_rows(
+            "SELECT COUNT(*) FROM user_data", dictionary=False), [(20,)])
+
+    def test_workers_cannot_be_incremental(self):
+        """A parallel load refuses to skip incremental checkpoints"""
+        with self.assertRaises(ValueError):
+            seed.insert_data(self.connection, self.csv, incremental=True,
+                             workers=2)
+
+
+class TestIngestIncremental(unittest.TestCase):
+    """ingest_incremental loads only what was appended since the last run"""
+
+    def setUp(self):
+        """Create an empty table and an empty CSV"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        self.csv = os.path.join(tmp.name, "users.csv")
+        self.write("name,email,age\n", "w")
+        with patch("builtins.print"):
+            self.connection = seed.connect_to_prodev()
+            seed.create_table(self.connection)
+        self.addCleanup(self.connection.close)
+
+    def write(self, text, mode="a"):
+        """Write text to the CSV"""
+        with open(self.csv, mode) as f:
+            f.write(text)
+
+    def rows(self, start, stop, prefix="user"):
+        """CSV lines for users start to stop"""
+        return "".join(f"User {i},{prefix}{i}@example.com,{20 + i % 50}\n"
+                       for i in range(start, stop))
+
+    def ingest(self):
+        """Run ingest_incremental; returns (rows processed, inserted)"""
+        return seed.ingest_incremental(self.connection, self.csv,
+                                       batch_size=4)
+
+    def emails(self):
+        """Emails in user_data, sorted"""
+        return sorted(row["email"] for row in seed.fetch_rows(
+            "SELECT email FROM user_data"))
+
+    def test_appended_tail(self):
+        """Only rows appended since the last run are read"""
+        self.write(self.rows(0, 10))
+        self.assertEqual(self.ingest(), (10, 10))
+        self.assertEqual(self.ingest(), (0, 0))
+        self.write(self.rows(10, 15))
+        self.assertEqual(self.ingest(), (5, 5))
+        self.assertEqual(len(self.emails()), 15)
+
+    def test_unterminated_line_is_deferred(self):
+        """A last line without a newline waits for the next run"""
+        self.write(self.rows(0, 3) + "User 3,user3@example.com,30")
+        self.assertEqual(self.ingest(), (3, 3))
+        self.assertNotIn("user3@example.com", self.emails())
+        self.write("\n" + self.rows(4, 5))
+        self.assertEqual(self.ingest(), (2, 2))
+        self.assertIn("user3@example.com", self.emails())
+
+    def test_rewritten_file_is_reingested(self):
+        """A file whose ingested prefix changed is loaded again in full"""
+        self.write(self.rows(0, 10))
+        self.ingest()
+        cases = [
+            ("rewritten", self.rows(0, 12, "new")),
+            ("truncated", self.rows(0, 3, "short")),
+        ]
+        for name, body in cases:
+            with self.subTest(name), patch("builtins.print") as out:
+                self.write("name,email,age\n" + body, "w")
+                lines = body.count("\n")
+                self.assertEqual(self.ingest(), (lines, lines))
+                self.assertIn("changed since last run",
+                              out.call_args.args[0])
+        self.assertEqual(len(self.emails()), 25)
+
+
+class TestAggregates(unittest.TestCase):
+    """The age aggregates stay equal to a recount of user_data"""
+
+    def setUp(self):
+        """Create an empty table and a CSV with duplicate emails"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        self.csv = os.path.join(tmp.name, "users.csv")
+        with open(self.csv, "w") as f:
+            f.write("name,email,age\n")
+            for i in range(40):
+                f.write(f"User {i},user{i % 30}@example.com,{18 + i}\n")
+        with patch("builtins.print"):
+            self.connection = seed.connect_to_prodev()
+            seed.create_table(self.connection)
+        self.addCleanup(self.connection.close)
+
+    def run_main(self, command):
+        """Run `seed.py command`; returns (exit code, printed lines)"""
+        with patch("sys.argv", ["seed.py", command]), \
+                patch("builtins.print") as out:
+            try:
+                seed.main()
+                code = 0
+            except SystemExit as e:
+                code = e.code
+        return code, [call.args[0] for call in out.call_args_list]
+
+    def test_loads_with_duplicates_stay_consistent(self):
+        """Every insert path counts only the rows it inserted"""
+        with patch("builtins.print"):
+            seed.insert_data(self.connection, self.csv, batch_size=7)
+            seed.insert_data(self.connection, self.csv, incremental=True)
+            seed.insert_data(None, self.csv, workers=2)
+            seed.populate(self.connection, 50)
+        self.assertEqual(
+            seed.rebuild_aggregates(self.connection, check_only=True), [])
+        summary = seed.age_summary(self.connection)
+        self.assertEqual(summary["count"], 50)
+        self.assertEqual(sum(summary["histogram"].values()), 50)
+
+    def test_verify_reports_drift(self):
+        """verify-aggregates reports writes made outside seed"""
+        with patch("builtins.print"):
+            seed.insert_data(self.connection, self.csv)
+        self.assertEqual(self.run_main("verify-aggregates"),
+                         (0, ["Aggregates are consistent"]))
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM user_data WHERE age = 18")
+        cursor.close()
+        self.connection.commit()
+
+        code, lines = self.run_main("verify-aggregates")
+        self.assertEqual(code, 1)
+        self.assertEqual(lines, ["age 18: stored 1, actual 0",
+                                 "count: stored 30, actual 29",
+                                 "2 aggregate mismatches"])
+        self.assertEqual(self.run_main("rebuild-aggregates"),
+                         (0, ["age 18: stored 1, actual 0",
+                              "count: stored 30, actual 29",
+                              "Aggregates rebuilt"]))
+        self.assertEqual(self.run_main("verify-aggregates"),
+                         (0, ["Aggregates are consistent"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""
+Unit tests for snapshot
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import seed
+import snapshot
+
+stream_ages = __import__('4-stream_ages')
+
+
+class SnapshotTestCase(unittest.TestCase):
+    """Snapshots of a throwaway SQLite user_data table"""
+
+    ROWS = 100
+
+    def setUp(self):
+        """Create and populate a temporary SQLite database"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        seed.use_backend("sqlite", path=os.path.join(tmp.name, "db"))
+        self.addCleanup(seed.get_pool().close_all)
+        with patch("builtins.print"):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            seed.populate(connection, self.ROWS)
+        connection.close()
+        self.path = os.path.join(tmp.name, "snapshot")
+        patcher = patch.dict(os.environ, {"ALX_SNAPSHOT_DIR": self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def execute(self, query, params=None):
+        """Run a write against user_data outside the snapshot"""
+        connection = seed.get_pool().get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+    def average_age(self):
+        """The average printed by calculate_average_age(mode="snapshot")"""
+        with patch("builtins.print") as out:
+            stream_ages.calculate_average_age(mode="snapshot")
+        return out.call_args.args[0]
+
+
+class TestAverageAge(SnapshotTestCase):
+    """mode="snapshot" only answers from a fresh snapshot"""
+
+    def test_fresh_snapshot_is_used(self):
+        """A fresh snapshot answers even after the table changed"""
+        snapshot.create()
+        before = self.average_age()
+        self.execute("UPDATE user_data SET age = 100")
+        self.assertEqual(self.average_age(), before)
+
+    def test_stale_snapshot_falls_back_to_table(self):
+        """A snapshot older than max age is ignored"""
+        snapshot.create()
+        self.execute("UPDATE user_data SET age = 100")
+        with patch.dict(os.environ, {"ALX_SNAPSHOT_MAX_AGE": "-1"}):
+            self.assertEqual(self.average_age(),
+                             "Average age of users: 100.00")
+
+    def test_missing_snapshot_falls_back_to_table(self):
+        """Without a snapshot the table is scanned"""
+        self.execute("UPDATE user_data SET age = 42")
+        self.assertEqual(self.average_age(), "Average age of users: 42.00")
+
+
+class TestRefresh(SnapshotTestCase):
+    """refresh() reads only what changed and proves the rest unchanged"""
+
+    def versions(self):
+        """Version directories of the snapshot"""
+        return sorted(name for name in os.listdir(self.path)
+                      if name.startswith("v"))
+
+    def insert(self, user_id):
+        """Insert a user with the given user_id"""
+        self.execute("INSERT INTO user_data VALUES (%s, %s, %s, %s)",
+                     (user_id, "New", f"{user_id}@example.com", 30))
+
+    def snapshot_ids(self):
+        """user_ids in the current snapshot, sorted"""
+        return sorted(row.decode() for row in
+                      snapshot.Snapshot().column("user_id").tolist())
+
+    def table_ids(self):
+        """user_ids in the table, sorted"""
+        return sorted(row["user_id"] for row in seed.fetch_rows(
+            "SELECT user_id FROM user_data"))
+
+    def test_no_new_rows(self):
+        """An unchanged table writes no new version but counts as fresh"""
+        snapshot.create()
+        versions = self.versions()
+        with patch.object(snapshot.time, "time",
+                          return_value=snapshot.time.time() + 600):
+            self.assertEqual(snapshot.refresh(), ("unchanged", 0))
+            self.assertLess(snapshot.Snapshot().age(), 1)
+        self.assertEqual(self.versions(), versions)
+
+    def test_rows_above_watermark(self):
+        """New rows sorting after every snapshot id use a range scan"""
+        snapshot.create()
+        self.insert("ffffffff-ffff-4fff-8fff-ffffffffffff")
+        self.assertEqual(snapshot.refresh(), ("watermark", 1))
+        self.assertEqual(self.snapshot_ids(), self.table_ids())
+
+    def test_rows_below_watermark(self):
+        """New rows sorting before the watermark are looked up by id"""
+        snapshot.create()
+        self.insert("00000000-0000-4000-8000-000000000000")
+        self.insert("ffffffff-ffff-4fff-8fff-ffffffffffff")
+        self.assertEqual(snapshot.refresh(), ("diff", 2))
+        self.assertEqual(self.snapshot_ids(), self.table_ids())
+
+    def test_delete_and_insert_rebuild(self):
+        """A delete hidden by an insert of the same count is detected"""
+        snapshot.create()
+        first = self.table_ids()[0]
+        self.execute("DELETE FROM user_data WHERE user_id = %s", (first,))
+        self.insert("00000000-0000-4000-8000-000000000000")
+        self.assertEqual(snapshot.refresh(), ("create", self.ROWS))
+        self.assertEqual(self.snapshot_ids(), self.table_ids())
+
+
+if __name__ == "__main__":
+    unittest.main()